@@ -1,6 +1,15 @@
-from dash import Dash, html, dcc, Input, Output, State
-import plotly.express as px
-import pandas as pd
+import math
+
+from dash import Dash, html, dcc, Input, Output, Patch, State, ctx, no_update
+from dash.exceptions import PreventUpdate
+
+from background import run_in_background
+from callback_chains import CallbackChain
+from event_throttle import checkpoint, install_session_key, latest_wins, replaces_dropped_call
+from figure_cache import memoize_figure
+from instrumentation import instrument, phase
+from partial_updates import axis_type_patch, only_triggered_by
+from serialization import versioned_layout
 
 '''
  Test no --> Demo concept
@@ -11,11 +20,18 @@ import pandas as pd
  5 --> Chained callback
  6 --> Stately dash app
  7 --> Reference without id
+
+ Every demo is a function returning its app (see `DEMOS` at the bottom and
+ `registry.py`, which serves all of them from one process). Data and the
+ numpy / pandas / plotly based helpers are imported inside the demos that use
+ them, so a demo only pays for what it needs.
 '''
 testNo = 7
 
-if testNo == 1:
-    app = Dash(__name__)
+
+def simple_callback(**dash_kwargs):
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     app.layout = html.Div([
         html.H6("Change the value in the text box to see callbakcs in action!"),
@@ -34,84 +50,241 @@ if testNo == 1:
     def update_output_div(input_value):
         return f"Output: {input_value}"
 
-elif testNo == 2:
-    app = Dash(__name__)
-
-    df = pd.read_csv('https://raw.githubusercontent.com/plotly/datasets/master/gapminderDataFiveYear.csv',
-                     )
-
-    app.layout = html.Div([
-        dcc.Graph(id='graph-with-slider'),
-        dcc.Slider(
-            df['year'].min(),
-            df['year'].max(),
-            step=None,
-            value=df['year'].min(),
-            marks={str(year) : str(year) for year in df['year'].unique()},
-            id='year-slider'
+    return app
+
+
+def figure_with_slider(**dash_kwargs):
+    from figure_templates import Gapminder
+    from live_data import LiveDataset
+
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
+    #   calls are throttled per page
+    install_session_key(app)
+
+    #   rows appended to data/gapminder.csv reach open pages within
+    #   `refresh_interval` ms, as the frames of the years they changed
+    #   (None: the data is read once)
+    refresh_interval = 5000
+    live = LiveDataset('gapminder', columns=['country', 'continent', 'year', 'pop', 'lifeExp', 'gdpPercap'])
+    df = live.frame
+
+    #   ship a frame for every year once, with the page, and let the slider pick
+    #   frames in the browser: scrubbing then costs no server requests at all
+    #   (False: one request per slider step)
+    client_side_frames = True
+    gapminder_template = Gapminder(df, size_max=55)
+
+    def slider_marks(years):
+        return {str(year) : str(year) for year in years}
+
+    #   the page embeds data (every frame and the version it is from): a layout
+    #   built, encoded and compressed once per version (see
+    #   `serialization.cache_layout`), so new pages start from the rows appended
+    #   since startup
+    @versioned_layout(live.latest_version)
+    def layout(version):
+        df = live.frame
+        return html.Div([
+            dcc.Graph(id='graph-with-slider'),
+            dcc.Slider(
+                df['year'].min(),
+                df['year'].max(),
+                step=None,
+                value=df['year'].min(),
+                marks=slider_marks(df['year'].unique()),
+                id='year-slider'
+            ),
+            dcc.Store(id='gapminder-frames',
+                      data=gapminder_template.animation(df) if client_side_frames else None),
+            dcc.Store(id='gapminder-version', data=version),
+            dcc.Store(id='gapminder-updates'),
+            dcc.Interval(id='gapminder-refresh', interval=refresh_interval or 60 * 1000,
+                         disabled=refresh_interval is None),
+        ])
+
+    app.layout = layout
+
+    if client_side_frames:
+        app.clientside_callback(
+            """
+            function(year, figure) {
+                var frame = figure.frames.find(function(f) { return f.name === String(year); });
+                if (!frame) { return window.dash_clientside.no_update; }
+                return {data: frame.data, layout: figure.layout};
+            }
+            """,
+            Output('graph-with-slider', 'figure'),
+            Input('year-slider', 'value'),
+            Input('gapminder-frames', 'data')
         )
-    ])
+        #   pushed frames replace the page's frames of the same year
+        app.clientside_callback(
+            """
+            function(updates, figure) {
+                var frames = updates.replace ? [] : figure.frames.slice();
+                updates.frames.forEach(function(frame) {
+                    var i = frames.findIndex(function(f) { return f.name === frame.name; });
+                    if (i < 0) { frames.push(frame); } else { frames[i] = frame; }
+                });
+                frames.sort(function(a, b) { return Number(a.name) - Number(b.name); });
+                return Object.assign({}, figure, {frames: frames});
+            }
+            """,
+            Output('gapminder-frames', 'data'),
+            Input('gapminder-updates', 'data'),
+            State('gapminder-frames', 'data'),
+            prevent_initial_call=True
+        )
+        pushed = Output('gapminder-updates', 'data')
+
+    else:
+        #   only a dozen distinct years: keep every built figure, optionally built at startup
+        warm_up_figures = True
+
+        @app.callback(
+            Output('graph-with-slider', 'figure'),
+            Input('year-slider', 'value'))
+        @memoize_figure(maxsize=32)
+        @latest_wins()
+        def update_figure(selected_year):
+            with phase('filter'):
+                filtered_df = live.select('year', [selected_year])
+            #   dragging the slider: give up if a newer year already came in
+            checkpoint()
+            with phase('build'):
+                return gapminder_template.figure(filtered_df)
+
+        if warm_up_figures:
+            update_figure.warm_up(df['year'].unique())
+        pushed = Output('graph-with-slider', 'figure', allow_duplicate=True)
 
     @app.callback(
-        Output('graph-with-slider', 'figure'),
-        Input('year-slider', 'value'))
-    def update_figure(selected_year):
-        filtered_df = df[df.year == selected_year]
-
-        fig = px.scatter(filtered_df, x='gdpPercap', y='lifeExp',
-                         size='pop', color='continent', hover_name='country',
-                         log_x=True, size_max=55)
-        fig.update_layout(transition_duration=500)
-        return fig
-
-elif testNo == 3:
-    app = Dash(__name__)
-
-    df = pd.read_csv("https://plotly.github.io/datasets/country_indicators.csv")
-
-    app.layout = html.Div([
-        html.Div([
-
-            html.Div([
-                dcc.Dropdown(
-                    df['Indicator Name'].unique(),
-                    'Fertility rate, total (births per woman)',
-                    id='xaxis-column'
-                ),
-                dcc.RadioItems(
-                    ['Linear', 'Log'],
-                    'Linear',
-                    id='xaxis-type',
-                    inline=True
-                )
-            ], style={'width' : '48%', 'display' : 'inline-block'}),
+        Output('gapminder-version', 'data'),
+        Output('year-slider', 'marks'),
+        Output('year-slider', 'min'),
+        Output('year-slider', 'max'),
+        pushed,
+        Input('gapminder-refresh', 'n_intervals'),
+        State('gapminder-version', 'data'),
+        State('year-slider', 'value'),
+        prevent_initial_call=True
+    )
+    def refresh_frames(n_intervals, version, selected_year):
+        live.poll()
+        rows = live.changes_since(version)
+        if rows is not None and rows.empty:
+            raise PreventUpdate
+        with phase('build'):
+            years = sorted(int(year) for year in live.unique('year'))
+            #   None: the page is older than the kept history, resend every year
+            changed = years if rows is None else sorted(int(year) for year in rows['year'].unique())
+            if client_side_frames:
+                update = {'replace' : rows is None,
+                          'frames' : gapminder_template.frames(live.select('year', changed), changed)}
+            else:
+                for year in changed:
+                    update_figure.discard(year)
+                update = (gapminder_template.figure(live.select('year', [selected_year]))
+                          if selected_year in changed else no_update)
+        return live.version, slider_marks(years), years[0], years[-1], update
+
+    return app
+
+
+def multiple_inputs(**dash_kwargs):
+    from downsample import downsample_scatter, is_zoom_event, minmax, visible_range
+    from figure_templates import IndicatorScatter
+    from indicator_store import IndicatorStore
+    from live_data import LiveDataset
+    from option_search import OptionIndex, searchable_dropdown
+    from raster import rasterize
+
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
+    install_session_key(app)
+
+    #   rows appended to data/country_indicators.csv are folded into the index
+    #   and reach the graph within `refresh_interval` ms when they change what it
+    #   shows (None: the data is read once)
+    refresh_interval = 5000
+    live = LiveDataset('country_indicators')
+    df = live.frame
+    indicators = IndicatorStore(df)
+    live.on_append(indicators.append)
+    #   the dropdowns search one index of the indicator names as the user types
+    indicator_names = OptionIndex(df['Indicator Name'].unique())
+    live.on_append(lambda rows: indicator_names.add(rows['Indicator Name'].unique()))
+
+    #   point budget, opt in (None ships every point), e.g. 2000; with a
+    #   budget, zooming re-fetches the zoomed window at full budget, unless
+    #   every point is already drawn
+    scatter_point_budget = None
+    #   more points than this in view are binned into a density heatmap on the
+    #   server, again on every zoom (None: always draw the points)
+    raster_threshold = 20000
+
+    scatter_template = IndicatorScatter(margin={'l':40, 'b':40, 't':40, 'r':0})
+
+    #   the dropdowns register their search callbacks: built once, shared by
+    #   every page
+    xaxis_dropdown = searchable_dropdown(
+        app, indicator_names,
+        'Fertility rate, total (births per woman)',
+        'xaxis-column'
+    )
+    yaxis_dropdown = searchable_dropdown(
+        app, indicator_names,
+        'Life expectancy at birth, total (years)',
+        'yaxis-column'
+    )
 
+    #   the slider and the version Store follow the data: a layout function
+    #   (see `figure_with_slider`)
+    @versioned_layout(live.latest_version)
+    def layout(version):
+        years = sorted(int(year) for year in live.unique('Year'))
+        return html.Div([
             html.Div([
-                dcc.Dropdown(
-                    df['Indicator Name'].unique(),
-                    'Life expectancy at birth, total (years)',
-                    id='yaxis-column'
-                ),
-                dcc.RadioItems(
-                    ['Linear', 'Log'],
-                    'Linear',
-                    id='yaxis-type',
-                    inline=True
-                )
-            ], style={'width' : '48%', 'float' : 'right', 'display' : 'inline-block'})
-        ]),
-
-        dcc.Graph(id='indicator-graphic'),
 
-        dcc.Slider(
-            df['Year'].min(),
-            df['Year'].max(),
-            step=None,
-            id='year--slider',
-            value=df['Year'].max(),
-            marks={str(year) : str(year) for year in df['Year'].unique()},
-        )
-    ])
+                html.Div([
+                    xaxis_dropdown,
+                    dcc.RadioItems(
+                        ['Linear', 'Log'],
+                        'Linear',
+                        id='xaxis-type',
+                        inline=True
+                    )
+                ], style={'width' : '48%', 'display' : 'inline-block'}),
+
+                html.Div([
+                    yaxis_dropdown,
+                    dcc.RadioItems(
+                        ['Linear', 'Log'],
+                        'Linear',
+                        id='yaxis-type',
+                        inline=True
+                    )
+                ], style={'width' : '48%', 'float' : 'right', 'display' : 'inline-block'})
+            ]),
+
+            dcc.Graph(id='indicator-graphic'),
+
+            dcc.Slider(
+                years[0],
+                years[-1],
+                step=None,
+                id='year--slider',
+                value=years[-1],
+                marks={str(year) : str(year) for year in years},
+            ),
+
+            dcc.Store(id='indicator-version', data=version),
+            dcc.Interval(id='indicator-refresh', interval=refresh_interval or 60 * 1000,
+                         disabled=refresh_interval is None),
+        ])
+
+    app.layout = layout
 
     @app.callback(
         Output('indicator-graphic', 'figure'),
@@ -119,31 +292,120 @@ elif testNo == 3:
         Input('yaxis-column', 'value'),
         Input('xaxis-type', 'value'),
         Input('yaxis-type', 'value'),
-        Input('year--slider', 'value')
+        Input('year--slider', 'value'),
+        Input('indicator-graphic', 'relayoutData')
     )
+    @latest_wins()
     def update_graph(xaxis_column_name, yaxis_column_name,
                      xaxis_type, yaxis_type,
-                     year_value):
-
-        dff = df[df['Year'] == year_value]
+                     year_value, relayoutData):
+        zoomed = ctx.triggered_id == 'indicator-graphic'
+        #   shortcuts only when no earlier call (a new year, say) was dropped
+        #   in favour of this one
+        shortcut = not replaces_dropped_call()
+        if shortcut and zoomed and not is_zoom_event(relayoutData):
+            return no_update
+        n_points = len(indicators.scatter(year_value, xaxis_column_name, yaxis_column_name)[0])
+        every_point = draws_every_point(n_points)
+        if shortcut and zoomed and every_point:
+            return no_update
+        #   a zoomed window's points: the patch's autorange would show them
+        #   as if they were all the data
+        windowed = not every_point and (visible_range(relayoutData, 'xaxis') is not None
+                                        or visible_range(relayoutData, 'yaxis') is not None)
+        if shortcut and only_triggered_by('xaxis-type', 'yaxis-type') and not windowed and (
+                raster_threshold is None or n_points <= raster_threshold):
+            #   Linear / Log toggles only touch the layout (a heatmap is binned
+            #   along its axes and is rebuilt)
+            return axis_type_patch(xaxis_type, yaxis_type)
+
+        return scatter_figure(xaxis_column_name, yaxis_column_name,
+                              xaxis_type, yaxis_type,
+                              year_value, relayoutData if zoomed and not every_point else None)
+
+    def draws_every_point(n_points):
+        #   neither thinned nor binned: the graph already has every point, and
+        #   plotly zooms without asking the server
+        return ((scatter_point_budget is None or n_points <= scatter_point_budget)
+                and (raster_threshold is None or n_points <= raster_threshold))
+
+    def scatter_figure(xaxis_column_name, yaxis_column_name,
+                       xaxis_type, yaxis_type,
+                       year_value, relayoutData):
+        with phase('filter'):
+            x, y, countries = indicators.scatter(year_value, xaxis_column_name, yaxis_column_name)
+            x_range = visible_range(relayoutData, 'xaxis', log=xaxis_type == 'Log') if relayoutData else None
+            y_range = visible_range(relayoutData, 'yaxis', log=yaxis_type == 'Log') if relayoutData else None
+            rows = downsample_scatter(x, y, None, x_range, y_range)
+            rasterized = raster_threshold is not None and len(rows) > raster_threshold
+            if rasterized:
+                raster = rasterize(x[rows], y[rows], x_range, y_range,
+                                   x_log=xaxis_type == 'Log', y_log=yaxis_type == 'Log')
+            elif scatter_point_budget is not None:
+                rows = rows[minmax(x[rows], y[rows], scatter_point_budget)]
+
+        checkpoint()
+        with phase('build'):
+            uirevision = '|'.join(map(str, (xaxis_column_name, yaxis_column_name,
+                                            xaxis_type, yaxis_type, year_value)))
+            if rasterized:
+                return scatter_template.density(
+                    raster, xaxis_column_name, xaxis_type, yaxis_column_name, yaxis_type,
+                    uirevision=uirevision)
+            return scatter_template.figure(
+                x[rows], y[rows], countries[rows],
+                xaxis_column_name, xaxis_type, yaxis_column_name, yaxis_type,
+                uirevision=uirevision)
 
-        fig = px.scatter(x=dff[dff['Indicator Name'] == xaxis_column_name]['Value'],
-                         y=dff[dff['Indicator Name'] == yaxis_column_name]['Value'],
-                         hover_name=dff[dff['Indicator Name'] == yaxis_column_name]['Country Name'])
-
-        fig.update_layout(margin={'l':40, 'b':40, 't':40, 'r':0}, hovermode='closest')
-
-        fig.update_xaxes(title=xaxis_column_name,
-                         type='linear' if xaxis_type == 'Linear' else 'log')
-
-        fig.update_yaxes(title=yaxis_column_name,
-                         type='linear' if yaxis_type == 'Linear' else 'log')
-
-        return fig
-
-elif testNo == 4:
+    @app.callback(
+        Output('indicator-version', 'data'),
+        Output('year--slider', 'marks'),
+        Output('year--slider', 'min'),
+        Output('year--slider', 'max'),
+        Output('indicator-graphic', 'figure', allow_duplicate=True),
+        Input('indicator-refresh', 'n_intervals'),
+        State('indicator-version', 'data'),
+        State('xaxis-column', 'value'),
+        State('yaxis-column', 'value'),
+        State('xaxis-type', 'value'),
+        State('yaxis-type', 'value'),
+        State('year--slider', 'value'),
+        State('indicator-graphic', 'relayoutData'),
+        prevent_initial_call=True
+    )
+    def refresh_graph(n_intervals, version,
+                      xaxis_column_name, yaxis_column_name,
+                      xaxis_type, yaxis_type,
+                      year_value, relayoutData):
+        live.poll()
+        rows = live.changes_since(version)
+        if rows is not None and rows.empty:
+            raise PreventUpdate
+        #   the figure is only resent when the two indicators it shows changed
+        #   in its year (None: the page is older than the kept history)
+        changed = rows is None or not rows[
+            (rows['Year'] == year_value)
+            & rows['Indicator Name'].isin([xaxis_column_name, yaxis_column_name])].empty
+        figure = no_update
+        if changed:
+            #   keep the traces, axes and zoom: only the data goes out
+            zoomed = is_zoom_event(relayoutData) and not draws_every_point(
+                len(indicators.scatter(year_value, xaxis_column_name, yaxis_column_name)[0]))
+            figure = Patch()
+            figure['data'] = scatter_figure(
+                xaxis_column_name, yaxis_column_name, xaxis_type, yaxis_type, year_value,
+                relayoutData if zoomed else None)['data']
+        years = sorted(int(year) for year in live.unique('Year'))
+        return (live.version, {str(year) : str(year) for year in years},
+                years[0], years[-1], figure)
+
+    return app
+
+
+def multiple_outputs(**dash_kwargs):
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
 
     app.layout = html.Div([
         dcc.Input(
@@ -163,23 +425,40 @@ elif testNo == 4:
             html.Tr([html.Td(['x', html.Sup('x')]),
                      html.Td(id='x^x')]),
         ]),
+        html.Div(id='powers-status'),
     ])
 
+    def show(value):
+        #   powers of a large x have thousands of digits: show them like 1.234e+5678
+        if isinstance(value, int) and value.bit_length() > 64:
+            exponent = math.log10(abs(value))
+            mantissa = 10 ** (exponent - math.floor(exponent))
+            return '{}{:.3f}e+{}'.format('-' if value < 0 else '', mantissa, math.floor(exponent))
+        return value
+
+    #   runs in a worker process: a huge x times out instead of pinning a server
+    #   thread, and the cells show why
     @app.callback(
         Output('square', 'children'),
         Output('cube', 'children'),
         Output('twos', 'children'),
         Output('threes', 'children'),
         Output('x^x', 'children'),
-        Input('num_multi', 'value')
+        Input('num_multi', 'value'),
+        running=[(Output('powers-status', 'children'), 'Computing...', '')]
     )
+    @run_in_background(timeout=2.0, placeholder=lambda error: (str(error),) * 5)
     def callback_a(x):
-        return x**2, x**3, 2**x, 3**x, x**x
+        return tuple(show(value) for value in (x**2, x**3, 2**x, 3**x, x**x))
+
+    return app
 
-elif testNo == 5:
+
+def chained_callbacks(**dash_kwargs):
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
 
     all_options = {
         'America' : ['New York City', 'San Francisco', 'Cincinnati'],
@@ -202,21 +481,26 @@ elif testNo == 5:
         html.Div(id='display-selected-values'),
     ])
 
-    @app.callback(
+    #   resolve the whole chain on the server: a country click costs one round
+    #   trip instead of one per link (False registers the three callbacks as usual)
+    single_round_trip = True
+    chain = CallbackChain()
+
+    @chain.callback(
         Output('cities-radio', 'options'),
         Input('countries-radio', 'value')
     )
     def set_cities_options(selected_country):
         return [{'label' : i, 'value' : i} for i in all_options[selected_country]]
 
-    @app.callback(
+    @chain.callback(
         Output('cities-radio', 'value'),
         Input('cities-radio', 'options')
     )
     def set_cities_value(available_options):
         return available_options[0]['value']
 
-    @app.callback(
+    @chain.callback(
         Output('display-selected-values', 'children'),
         Input('countries-radio', 'value'),
         Input('cities-radio', 'value')
@@ -226,37 +510,65 @@ elif testNo == 5:
             selected_city, selected_country
         )
 
-elif testNo == 6:
+    chain.register(app, merge=single_round_trip)
+
+    return app
+
+
+def dash_app_with_state(**dash_kwargs):
     '''
     In form-like application, you want to read the value of an input component only when 
     the user is finished entering all of the information, rather than immediately after 
     it changes.
     '''
+    from session_store import DiskBackend, MemoryBackend, SessionStore
+
     external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
+
+    #   earlier submissions stay on the server, per browser session: only a
+    #   session cookie travels with the requests (True: an SQLite file that every
+    #   worker process of serve.py shares)
+    shared_across_workers = False
+    submissions = SessionStore(DiskBackend() if shared_across_workers else MemoryBackend(),
+                               ttl=30 * 60, namespace='callback/state')
+    submissions.install(app)
 
     app.layout = html.Div([
         dcc.Input(id="input-1-state", type="text", value="Montreal"),
         dcc.Input(id="input-2-state", type="text", value="Canada"),
         html.Button(id="submit-button-state", n_clicks=0, children="Submit"),
         html.Div(id="output-state"),
+        html.Div(id="output-history"),
     ])
 
     @app.callback(
         Output('output-state', 'children'),
+        Output('output-history', 'children'),
         Input('submit-button-state', 'n_clicks'),
         State('input-1-state', 'value'),
         State('input-2-state', 'value')
     )
     def update_output(n_clicks, input1, input2):
+        history = submissions.get('history', [])
+        if n_clicks:
+            history = (history + [(input1, input2)])[-10:]
+            submissions.set('history', history)
         return u'''
             The button has been pressed {} times,
             Input 1 is "{}",
             Input 2 is "{}".
-        '''.format(n_clicks, input1, input2)
+        '''.format(n_clicks, input1, input2), html.Ul([
+            html.Li('{}, {}'.format(*submission)) for submission in reversed(history)
+        ])
+
+    return app
+
 
-elif testNo == 7:
-    app = Dash(__name__)
+def reference_without_id(**dash_kwargs):
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     app.layout = html.Div([
         html.H6("Change the value in the text boc to see callbvacks in action!"),
@@ -275,5 +587,19 @@ elif testNo == 7:
     def update_output(input_value):
         return f"Output: {input_value}."
 
+    return app
+
+
+DEMOS = {
+    1 : simple_callback,
+    2 : figure_with_slider,
+    3 : multiple_inputs,
+    4 : multiple_outputs,
+    5 : chained_callbacks,
+    6 : dash_app_with_state,
+    7 : reference_without_id,
+}
+
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    app = DEMOS[testNo]()
+    app.run_server(debug=True)
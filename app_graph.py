@@ -1,85 +1,143 @@
-import json
 
-from dash import Dash, Input, Output, State
+from dash import Dash, Input, Output, ctx, no_update
 from dash import html, dcc
-import pandas as pd
-import numpy as np
-import plotly.express as px
+
+from event_throttle import coalesce_events, install_session_key, latest_wins, replaces_dropped_call
+from instrumentation import instrument, phase
+from partial_updates import axis_type_patch, only_triggered_by, yaxis_type_patch
+from serialization import pretty, versioned_layout
 
 '''
 testNo --> demo concept
 1 --> hoverData
 2 --> overall
 3 --> Generic Crossfilter Recipe
+
+Each demo is a function returning its app, listed in `DEMOS` at the bottom;
+heavy imports and data loading happen inside it (see `registry.py`).
 '''
 testNo = 2
 
-if testNo == 1:
+
+def hover_data(**dash_kwargs):
+    from downsample import downsample_line, downsample_scatter, is_zoom_event, minmax, visible_range
+    from figure_templates import IndicatorScatter, TimeSeries
+    from indicator_store import IndicatorStore, TimeSeriesIndex
+    from live_data import LiveDataset
+    from option_search import OptionIndex, searchable_dropdown
+    from raster import rasterize
+
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
-    df = pd.read_csv('https://plotly.github.io/datasets/country_indicators.csv')
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
+    #   calls are throttled per page
+    install_session_key(app)
+    #   rows appended to data/country_indicators.csv are folded into the
+    #   indexes and show up with the next hover or change of the controls
+    live = LiveDataset('country_indicators')
+    df = live.frame
+    indicators = IndicatorStore(df)
+    time_series = TimeSeriesIndex(df)
+    live.on_append(indicators.append)
+    live.on_append(time_series.append)
+    #   the dropdowns search one index of the indicator names as the user types
+    indicator_names = OptionIndex(df['Indicator Name'].unique())
+    live.on_append(lambda rows: indicator_names.add(rows['Indicator Name'].unique()))
+
+    #   point budgets, opt in (None ships every point), e.g. 2000 and 1000;
+    #   with a budget, zooming re-fetches the zoomed window at full budget,
+    #   unless every point is already drawn
+    scatter_point_budget = None
+    line_point_budget = None
+    #   more points than this in view are binned into a density heatmap on the
+    #   server, again on every zoom; hovering a cell shows one of its countries
+    #   (None: always draw the points)
+    raster_threshold = 20000
+
+    scatter_template = IndicatorScatter(margin={'l':40, 'b':40, 't':10, 'r':0})
+    time_series_template = TimeSeries()
+
+    #   neither thinned nor binned: the graph already has every point, and
+    #   plotly zooms without asking the server
+    def scatter_draws_every_point(n_points):
+        return ((scatter_point_budget is None or n_points <= scatter_point_budget)
+                and (raster_threshold is None or n_points <= raster_threshold))
+
+    def line_draws_every_point(years):
+        return line_point_budget is None or len(years) <= line_point_budget
+
+    #   built once: the dropdowns register their search callbacks
+    xaxis_dropdown = searchable_dropdown(
+        app, indicator_names,
+        'Fertility rate, total (births per woman)',
+        'crossfilter-xaxis-column'
+    )
+    yaxis_dropdown = searchable_dropdown(
+        app, indicator_names,
+        'Life expectancy at birth, total (years)',
+        'crossfilter-yaxis-column'
+    )
 
-    app.layout = html.Div([
-        html.Div([
+    #   the slider offers the years appended since startup: a layout built once
+    #   per version of the data
+    @versioned_layout(live.latest_version)
+    def layout(version):
+        years = sorted(int(year) for year in live.unique('Year'))
+        return html.Div([
+            html.Div([
+
+                html.Div([
+                    xaxis_dropdown,
+                    dcc.RadioItems(
+                        ['Linear', 'Log'],
+                        'Linear',
+                        id='crossfilter-xaxis-type',
+                        labelStyle={'display' : 'inline-block', 'marginTop' : '5px'}
+                    )
+                ],
+                style={'width'  : '49%', 'display' : 'inline-block'}),
+
+                html.Div([
+                    yaxis_dropdown,
+                    dcc.RadioItems(
+                        ['Linear', 'Log'],
+                        'Linear',
+                        id='crossfilter-yaxis-type',
+                        labelStyle={'display' : 'inline-block', 'marginTop' : '5px'}
+                    )
+                ],
+                style={'width' : '49%', 'float' : 'right', 'display' : 'inline-block'})
+            ],
+            style = {'padding' : '10px 5px'}),
 
             html.Div([
-                dcc.Dropdown(
-                    df['Indicator Name'].unique(),
-                    'Fertility rate, total (births per woman)',
-                    id='crossfilter-xaxis-column',
-                ),
-                dcc.RadioItems(
-                    ['Linear', 'Log'],
-                    'Linear',
-                    id='crossfilter-xaxis-type',
-                    labelStyle={'display' : 'inline-block', 'marginTop' : '5px'}
+                dcc.Graph(
+                    id='crossfilter-indicator-scatter',
+                    hoverData={'points':[{'customdata':'Japan'}]}
                 )
             ],
-            style={'width'  : '49%', 'display' : 'inline-block'}),
+            style={'width':'49%', 'display':'inline-block', 'padding':'0 20p'}),
 
             html.Div([
-                dcc.Dropdown(
-                    df['Indicator Name'].unique(),
-                    'Life expectancy at birth, total (years)',
-                    id='crossfilter-yaxis-column'
-                ),
-                dcc.RadioItems(
-                    ['Linear', 'Log'],
-                    'Linear',
-                    id='crossfilter-yaxis-type',
-                    labelStyle={'display' : 'inline-block', 'marginTop' : '5px'}
+                dcc.Graph(id='x-time-series'),
+                dcc.Graph(id='y-time-series'),
+            ],
+            style={'display':'inline-block', 'width' : '49%'}),
+
+            html.Div([
+                dcc.Slider(
+                    years[0],
+                    years[-1],
+                    step=None,
+                    id='crossfilter--year--slider',
+                    value=years[-1],
+                    marks={str(year) : str(year) for year in years}
                 )
             ],
-            style={'width' : '49%', 'float' : 'right', 'display' : 'inline-block'})
-        ],
-        style = {'padding' : '10px 5px'}),
-
-        html.Div([
-            dcc.Graph(
-                id='crossfilter-indicator-scatter',
-                hoverData={'points':[{'customdata':'Japan'}]}
-            )
-        ],
-        style={'width':'49%', 'display':'inline-block', 'padding':'0 20p'}),
-
-        html.Div([
-            dcc.Graph(id='x-time-series'),
-            dcc.Graph(id='y-time-series'),
-        ],
-        style={'display':'inline-block', 'width' : '49%'}),
-
-        html.Div([
-            dcc.Slider(
-                df['Year'].min(),
-                df['Year'].max(),
-                step=None,
-                id='crossfilter--year--slider',
-                value=df['Year'].max(),
-                marks={str(year) : str(year) for year in df['Year'].unique()}
-            )
-        ],
-        style={'width':'49%', 'padding':'0px 20px 20px 20px'})
-    ])
+            style={'width':'49%', 'padding':'0px 20px 20px 20px'})
+        ])
+
+    app.layout = layout
 
     @app.callback(
         Output('crossfilter-indicator-scatter', 'figure'),
@@ -87,63 +145,135 @@ if testNo == 1:
         Input('crossfilter-yaxis-column', 'value'),
         Input('crossfilter-xaxis-type', 'value'),
         Input('crossfilter-yaxis-type', 'value'),
-        Input('crossfilter--year--slider', 'value')
+        Input('crossfilter--year--slider', 'value'),
+        Input('crossfilter-indicator-scatter', 'relayoutData')
     )
+    @latest_wins()
     def update_graph(xaxis_column_name, yaxis_column_name,
                      xaxis_type, yaxis_type,
-                     year_value):
-        dff = df[df['Year']==year_value]
-        fig = px.scatter(x=dff[dff['Indicator Name'] == xaxis_column_name]['Value'],
-                         y=dff[dff['Indicator Name'] == yaxis_column_name]['Value'],
-                         hover_name=dff[dff['Indicator Name'] == yaxis_column_name]['Country Name'])
-
-        fig.update_traces(customdata=dff[dff['Indicator Name'] == yaxis_column_name]['Country Name'])
-
-        fig.update_xaxes(title=xaxis_column_name, type='linear' if xaxis_type=='Linear' else 'log')
-        fig.update_yaxes(title=yaxis_column_name, type='linear' if yaxis_type=='Linear' else 'log')
-        fig.update_layout(margin={'l':40, 'b':40, 't':10, 'r':0},
-                          hovermode='closest')
-        return fig
-
-    def create_time_series(dff, axis_type, title):
-        fig = px.scatter(dff, x='Year', y='Value')
-        fig.update_traces(mode='lines+markers')
-        fig.update_xaxes(showgrid=False)
-        fig.update_yaxes(type='linear' if axis_type == 'Linear' else 'log')
-        fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
-                           xref='paper', yref='paper', showarrow=False, align='left',
-                           text=title)
-        fig.update_layout(height=225, margin={'l':20, 'b':30, 'r':10, 't':10})
-        return fig
-
+                     year_value, relayoutData):
+        zoomed = ctx.triggered_id == 'crossfilter-indicator-scatter'
+        #   the browser dropped the response of any earlier call still out:
+        #   shortcuts only when there was none
+        shortcut = not replaces_dropped_call()
+        if shortcut and zoomed and not is_zoom_event(relayoutData):
+            return no_update
+        live.poll()
+        with phase('filter'):
+            x, y, countries = indicators.scatter(year_value, xaxis_column_name, yaxis_column_name)
+        every_point = scatter_draws_every_point(len(x))
+        if shortcut and zoomed and every_point:
+            return no_update
+        #   a zoomed window's points: the patch's autorange would show them
+        #   as if they were all the data
+        windowed = not every_point and (visible_range(relayoutData, 'xaxis') is not None
+                                        or visible_range(relayoutData, 'yaxis') is not None)
+        if shortcut and only_triggered_by('crossfilter-xaxis-type', 'crossfilter-yaxis-type') and (
+                not windowed and (raster_threshold is None or len(x) <= raster_threshold)):
+            #   Linear / Log toggles only touch the layout (a heatmap is binned
+            #   along its axes and is rebuilt)
+            return axis_type_patch(xaxis_type, yaxis_type)
+
+        zoomed = zoomed and not every_point
+        with phase('filter'):
+            x_range = visible_range(relayoutData, 'xaxis', log=xaxis_type == 'Log') if zoomed else None
+            y_range = visible_range(relayoutData, 'yaxis', log=yaxis_type == 'Log') if zoomed else None
+            rows = downsample_scatter(x, y, None, x_range, y_range)
+            rasterized = raster_threshold is not None and len(rows) > raster_threshold
+            if rasterized:
+                raster = rasterize(x[rows], y[rows], x_range, y_range,
+                                   x_log=xaxis_type == 'Log', y_log=yaxis_type == 'Log')
+            elif scatter_point_budget is not None:
+                rows = rows[minmax(x[rows], y[rows], scatter_point_budget)]
+            x, y, countries = x[rows], y[rows], countries[rows]
+
+        with phase('build'):
+            uirevision = '|'.join(map(str, (xaxis_column_name, yaxis_column_name,
+                                            xaxis_type, yaxis_type, year_value)))
+            if rasterized:
+                return scatter_template.density(
+                    raster, xaxis_column_name, xaxis_type, yaxis_column_name, yaxis_type,
+                    labels=countries, uirevision=uirevision)
+            return scatter_template.figure(
+                x, y, countries,
+                xaxis_column_name, xaxis_type, yaxis_column_name, yaxis_type,
+                customdata=countries, uirevision=uirevision)
+
+    def create_time_series(years, values, axis_type, title, x_range=None):
+        with phase('filter'):
+            rows = downsample_line(years, values, line_point_budget, x_range)
+        with phase('build'):
+            return time_series_template.figure(years[rows], values[rows], axis_type, title)
+
+    #   both time series share one callback: a hover event builds both figures from
+    #   one index lookup, while an x / y control change only rebuilds its own figure
     @app.callback(
         Output('x-time-series', 'figure'),
-        Input('crossfilter-indicator-scatter', 'hoverData'),
-        Input('crossfilter-xaxis-column', 'value'),
-        Input('crossfilter-xaxis-type', 'value')
-    )
-    def update_x_timeseries(hoverData, xaxis_column_name, axis_type):
-        country_name = hoverData['points'][0]['customdata']
-        dff = df[df['Country Name']==country_name]
-        dff = dff[dff['Indicator Name']==xaxis_column_name]
-        title = '<b>{}</b><br>{}'.format(country_name, xaxis_column_name)
-        return create_time_series(dff, axis_type, title)
-
-    @app.callback(
         Output('y-time-series', 'figure'),
         Input('crossfilter-indicator-scatter', 'hoverData'),
+        Input('crossfilter-xaxis-column', 'value'),
+        Input('crossfilter-xaxis-type', 'value'),
         Input('crossfilter-yaxis-column', 'value'),
-        Input('crossfilter-yaxis-type', 'value')
+        Input('crossfilter-yaxis-type', 'value'),
+        Input('x-time-series', 'relayoutData'),
+        Input('y-time-series', 'relayoutData')
     )
-    def update_y_timeseries(hoverData, yaxis_column_name, yaxis_type):
+    @coalesce_events(window=0.05)
+    def update_timeseries(hoverData, xaxis_column_name, xaxis_type,
+                          yaxis_column_name, yaxis_type,
+                          x_relayoutData, y_relayoutData):
+        live.poll()
         country_name = hoverData['points'][0]['customdata']
-        dff = df[df['Country Name']==country_name]
-        dff = dff[dff['Indicator Name'] == yaxis_column_name]
-        return create_time_series(dff, yaxis_type, yaxis_column_name)
+        x_series = time_series.series(country_name, xaxis_column_name)
+        y_series = time_series.series(country_name, yaxis_column_name)
+        #   as in `update_graph`: no shortcut for a call standing in for one
+        #   the browser dropped, and no autorange over a zoomed window
+        shortcut = not replaces_dropped_call()
+        x_windowed = (visible_range(x_relayoutData) is not None
+                      and not line_draws_every_point(x_series[0]))
+        y_windowed = (visible_range(y_relayoutData) is not None
+                      and not line_draws_every_point(y_series[0]))
+
+        #   the time series plot each indicator on their y axis
+        if shortcut and ctx.triggered_id == 'crossfilter-xaxis-type' and not x_windowed:
+            return yaxis_type_patch(xaxis_type), no_update
+        if shortcut and ctx.triggered_id == 'crossfilter-yaxis-type' and not y_windowed:
+            return no_update, yaxis_type_patch(yaxis_type)
+
+        x_zoomed = (ctx.triggered_id == 'x-time-series' and is_zoom_event(x_relayoutData)
+                    and not line_draws_every_point(x_series[0]))
+        y_zoomed = (ctx.triggered_id == 'y-time-series' and is_zoom_event(y_relayoutData)
+                    and not line_draws_every_point(y_series[0]))
+        x_changed = not shortcut or x_zoomed or ctx.triggered_id in (
+            None, 'crossfilter-indicator-scatter',
+            'crossfilter-xaxis-column', 'crossfilter-xaxis-type')
+        y_changed = not shortcut or y_zoomed or ctx.triggered_id in (
+            None, 'crossfilter-indicator-scatter',
+            'crossfilter-yaxis-column', 'crossfilter-yaxis-type')
+
+        x_fig = y_fig = no_update
+        if x_changed:
+            title = '<b>{}</b><br>{}'.format(country_name, xaxis_column_name)
+            x_fig = create_time_series(*x_series,
+                                       xaxis_type, title,
+                                       visible_range(x_relayoutData) if x_zoomed else None)
+        if y_changed:
+            y_fig = create_time_series(*y_series,
+                                       yaxis_type, yaxis_column_name,
+                                       visible_range(y_relayoutData) if y_zoomed else None)
+        return x_fig, y_fig
+
+    return app
+
+
+def basic_interactions(**dash_kwargs):
+    import pandas as pd
+    import plotly.express as px
 
-elif testNo == 2:
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
+    install_session_key(app)
     styles ={
         'pre' : {
             'border' : 'thin lightgrey solid',
@@ -218,41 +348,91 @@ elif testNo == 2:
         ])
     ])
 
-    @app.callback(
-        Output('hover-data', 'children'),
-        Input('basic-interactions', 'hoverData')
-    )
-    def display_hover_data(hoverData):
-        return json.dumps(hoverData, indent=2)
+    #   the inspectors only pretty-print event payloads: run them in the browser
+    #   and keep the server callbacks as a fallback
+    clientside_inspectors = True
+
+    inspectors = [
+        ('hover-data', 'hoverData'),
+        ('click-data', 'clickData'),
+        ('selected-data', 'selectedData'),
+        ('relayout-data', 'relayoutData'),
+    ]
+
+    if clientside_inspectors:
+        for output_id, event in inspectors:
+            app.clientside_callback(
+                """
+                function(data) {
+                    return JSON.stringify(data, null, 2);
+                }
+                """,
+                Output(output_id, 'children'),
+                Input('basic-interactions', event)
+            )
 
-    @app.callback(
-        Output('click-data', 'children'),
-        Input('basic-interactions', 'clickData')
-    )
-    def display_click_data(clickData):
-        return json.dumps(clickData, indent=2)
+    else:
+        @app.callback(
+            Output('hover-data', 'children'),
+            Input('basic-interactions', 'hoverData')
+        )
+        @coalesce_events(window=0.05)
+        def display_hover_data(hoverData):
+            return pretty(hoverData)
 
-    @app.callback(
-        Output('selected-data', 'children'),
-        Input('basic-interactions', 'selectedData')
-    )
-    def display_selected_data(selectedData):
-        return json.dumps(selectedData, indent=2)
+        @app.callback(
+            Output('click-data', 'children'),
+            Input('basic-interactions', 'clickData')
+        )
+        @coalesce_events(window=0.05)
+        def display_click_data(clickData):
+            return pretty(clickData)
 
-    @app.callback(
-        Output('relayout-data', 'children'),
-        Input('basic-interactions', 'relayoutData')
-    )
-    def display_relayout_data(relayoutData):
-        return json.dumps(relayoutData, indent=2)
+        @app.callback(
+            Output('selected-data', 'children'),
+            Input('basic-interactions', 'selectedData')
+        )
+        @coalesce_events(window=0.05)
+        def display_selected_data(selectedData):
+            return pretty(selectedData)
+
+        @app.callback(
+            Output('relayout-data', 'children'),
+            Input('basic-interactions', 'relayoutData')
+        )
+        @coalesce_events(window=0.05)
+        def display_relayout_data(relayoutData):
+            return pretty(relayoutData)
+
+    return app
+
+
+def generic_crossfilter(**dash_kwargs):
+    import numpy as np
+    import pandas as pd
+
+    from crossfilter import CrossfilterEngine
+    from figure_templates import CrossfilterScatter
 
-elif testNo == 3:
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-    app = Dash(__name__, external_stylesheets=external_stylesheets)
+    app = Dash(__name__, external_stylesheets=external_stylesheets, **dash_kwargs)
+    instrument(app)
 
     #   make a sample data frame with 6 columns
     np.random.seed(0)   #   no-display
-    df = pd.DataFrame({"Col " + str(i+1) : np.random.rand(30) for i in range(6)})
+    n_rows = 30
+    df = pd.DataFrame({"Col " + str(i+1) : np.random.rand(n_rows) for i in range(6)})
+
+    graph_columns = {
+        'g1' : ('Col 1', 'Col 2'),
+        'g2' : ('Col 3', 'Col 4'),
+        'g3' : ('Col 5', 'Col 6'),
+    }
+    engine = CrossfilterEngine(df, graph_columns)
+
+    #   with more rows than this each graph is a density heatmap of all rows
+    #   under one of the selected rows (box selections only; None: points)
+    raster_threshold = 100000
 
     #   configure app layout
     app.layout = html.Div([
@@ -267,50 +447,56 @@ elif testNo == 3:
         ),
         html.Div(
             dcc.Graph(id='g3', config={'displayModeBar' : False}),
-            classNAme='four columns'
+            className='four columns'
         )
     ],
     className='row')
 
-def get_figure(df, x_col, y_col, selectedpoints, selectedpoints_local):
-    if selectedpoints_local and selectedpoints_local['range']:
-        ranges = selectedpoints_local['range']
-        selection_bounds = {
-            'x0' : ranges['x'][0], 'x1' : ranges['x'][1],
-            'y0' : ranges['y'[0]], 'y1' : ranges['y'][1]
-        }
-    else:
-        selection_bounds = {
-            'x0' : np.min(df[x_col]), 'x1' : np.max(df[x_col]),
-            'y0' : np.min(df[y_col]), 'y1' : np.max(df[y_col])
-        }
+    #   the plotted rows never change: build each graph's figure once
+    templates = {graph : CrossfilterScatter(df, x_col, y_col, raster_threshold=raster_threshold)
+                 for graph, (x_col, y_col) in graph_columns.items()}
+
+    def get_figure(graph, selectedpoints, selection_bounds):
+        #   set which points are selected with the `selectedpoints` property
+        #   and style those points with the `selected` and `unselected`
+        #   attribute. See
+        #   https://medium.com/@plotlygraphs/notes-from-the-latest-plotly-js-release-b035a5b43e21
+        #   for an explanation
+        return templates[graph].figure(selectedpoints, selection_bounds)
 
-    #   set which points are selected with the `selectedpoints` property
-    #   and style those points with the `selected` and `unselected`
-    #   attribute. See
-    #   https://medium.com/@plotlygraphs/notes-from-the-latest-plotly-js-release-b035a5b43e21
-    #   for an explanation
-    fig = px. scatter(df, x=df[x_col], y=df[y_col], text=df.index)
-
-    fig.update_traces(selectedpoints=selectedpoints,
-                      customdata=df.index,
-                      mode='markers+text',
-                      marker={
-                          'color' : 'rgba(0, 116, 217, 0.7)',
-                          'size' : 20
-                      },
-                      unselected={
-                          'marker' : {'opacity' : 0.3},
-                          'textfont' : {'color' : 'rgba(0,0 0,0 0)'}
-                      })
-
-    fig.update_layout(
-        margin={'l':20, 'r':0, 'b':15, 't':5},
-        dragmode='select', hovermode=Fakse
+    #   this callback defines 3 figures
+    #   as a function of the intersection of their 3 selections
+    @app.callback(
+        Output('g1', 'figure'),
+        Output('g2', 'figure'),
+        Output('g3', 'figure'),
+        Input('g1', 'selectedData'),
+        Input('g2', 'selectedData'),
+        Input('g3', 'selectedData')
     )
+    def callback(selection1, selection2, selection3):
+        selections = {'g1' : selection1, 'g2' : selection2, 'g3' : selection3}
+        with phase('filter'):
+            selectedpoints = engine.selected_points(selections)
+
+        with phase('build'):
+            if ctx.triggered_id is None:
+                return [get_figure(graph, selectedpoints, engine.bounds(graph, selections[graph]))
+                        for graph in graph_columns]
+            #   the graphs already show their figures: only the selection and
+            #   its rectangle change
+            return [templates[graph].patch(selectedpoints, engine.bounds(graph, selections[graph]))
+                    for graph in graph_columns]
+
+    return app
 
-    fig.add_shape()
 
+DEMOS = {
+    1 : hover_data,
+    2 : basic_interactions,
+    3 : generic_crossfilter,
+}
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    app = DEMOS[testNo]()
+    app.run_server(debug=True)
@@ -11,26 +11,24 @@
 5.  Dash includes "hot-reloading" automatically refresh your browser when you make changes to your code.
     USe `app.run_server(dev_tools_hot_reload=False) to turn off hot-reloading.
 
+Each demo is a function returning its app, listed in `DEMOS` at the bottom;
+pandas, plotly and the datasets are imported inside the demos that use them
+(see `registry.py`).
 '''
 from dash import Dash, html, dcc
-import plotly.express as px
-import pandas as pd
-
-def generate_table(dataframe, max_rows=10):
-    return html.Table([
-        html.Thead(
-            html.Tr([html.Th(col) for col in dataframe.columns])
-        ),
-        html.Tbody([
-            html.Tr([
-                html.Td(dataframe.iloc[i][col]) for col in dataframe.columns
-            ]) for i in range(min(len(dataframe), max_rows))
-        ])
-    ])
+
+from instrumentation import instrument
+from tables import generate_table, paged_table
 
 test = "dcc"
-if test == "simple":
-    app = Dash(__name__)
+
+
+def simple(**dash_kwargs):
+    import pandas as pd
+    import plotly.express as px
+
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     # assume you have a "long-form" data frame
     # see https://plotly.com/python/px-arguments/ for more options
@@ -55,8 +53,15 @@ if test == "simple":
         ]
     )
 
-elif test == "styling":
-    app = Dash(__name__)
+    return app
+
+
+def styling(**dash_kwargs):
+    import pandas as pd
+    import plotly.express as px
+
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     colors = {
         'background'    :   '#111111',
@@ -111,20 +116,32 @@ elif test == "styling":
         ]
     )
 
-elif test == "reusable":
-    df = pd.read_csv('https://gist.githubusercontent.com/chriddyp/c78bf172206ce24f77d6363a2d754b59/raw/c353e8ef842413cae56ae3920b8fd78468aa4cb2/usa-agricultural-exports-2011.csv',
-                     index_col=[0])
-    app = Dash(__name__)
+    return app
+
+
+def reusable_components(**dash_kwargs):
+    from datasets import load_dataset
+
+    df = load_dataset('usa_agricultural_exports_2011')
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
     app.layout = html.Div([
         html.H4(children='US Agriculture Exports (2011)'),
-        generate_table(df)
+        paged_table(app, df, 'exports-table', page_size=10)
     ])
 
-elif test == "graph":
-    app = Dash(__name__)
+    return app
 
-    df = pd.read_csv('https://gist.githubusercontent.com/chriddyp/5d1ea79569ed194d432e56108a04d188/raw/a9f9e8076b837d541398e999dcbac2b2826a81f8/gdp-life-exp-2007.csv',
-                     index_col=[0])
+
+def graph(**dash_kwargs):
+    import plotly.express as px
+
+    from datasets import load_dataset
+
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
+
+    df = load_dataset('gdp_life_exp_2007')
     fig  = px.scatter(df, x="gdp per capita", y="life expectancy",
                       size="population", color="continent", hover_name="country",
                       log_x=True, size_max=60)
@@ -137,8 +154,12 @@ elif test == "graph":
         )
     ])
 
-elif test == "markdown":
-    app = Dash(__name__)
+    return app
+
+
+def markdown(**dash_kwargs):
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     markdown_text = '''
     ### Dash and Markdown
@@ -154,8 +175,12 @@ elif test == "markdown":
         dcc.Markdown(children=markdown_text)
     ])
 
-elif test == 'dcc':
-    app = Dash(__name__)
+    return app
+
+
+def core_components(**dash_kwargs):
+    app = Dash(__name__, **dash_kwargs)
+    instrument(app)
 
     app.layout = html.Div([
         html.Div(children=[
@@ -193,5 +218,18 @@ elif test == 'dcc':
         ], style={'padding' : 10, 'flex' : 1})
     ],style={'display' : 'flex', 'flex-direction' : 'row'})
 
+    return app
+
+
+DEMOS = {
+    'simple' : simple,
+    'styling' : styling,
+    'reusable' : reusable_components,
+    'graph' : graph,
+    'markdown' : markdown,
+    'dcc' : core_components,
+}
+
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    app = DEMOS[test]()
+    app.run_server(debug=True)
@@ -0,0 +1,182 @@
+'''
+Run CPU-heavy callbacks in worker processes, with a time limit.
+
+A callback like `callback_a` (testNo 4 of `app_callback.py`) computes `x**x` on
+whatever number the user types. A large x pins a server thread for seconds and
+returns an integer nobody can display. `run_in_background` moves the call into a
+worker process:
+
+    timeout             --> the worker is killed after `timeout` seconds
+    memory_limit        --> bytes the worker may allocate on top of what it
+                            inherited (Unix only)
+    max_result_bytes    --> larger (pickled) results are refused
+    cache_size          --> results, and the placeholders of calls that failed
+                            the same way on every run (an exception, a result
+                            too large), are kept per input in an LRU, so a
+                            repeated input costs a dictionary lookup
+    placeholder         --> placeholder(error) gives the outputs shown when the
+                            call fails; without it the BackgroundError is raised
+
+At most `MAX_WORKERS` calls run at once per server process. Each call gets a
+fresh worker, forked where the platform allows it (closures then work as
+callbacks), because a worker from a long-lived pool cannot be stopped once its
+call has run past the timeout. While a call is running, the demo shows a
+placeholder through the `running=` argument of `app.callback`.
+'''
+import functools
+import multiprocessing
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from figure_cache import hashable_inputs
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MAX_WORKERS = os.cpu_count() or 1
+
+_slots = threading.BoundedSemaphore(MAX_WORKERS)
+
+if 'fork' in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context('fork')
+else:
+    _context = multiprocessing.get_context()
+
+
+class BackgroundError(Exception):
+    pass
+
+
+class BackgroundTransient(BackgroundError):
+    #   timed out, ran out of memory or lost its worker: the same input may
+    #   succeed on a less loaded server, so the failure is never cached
+    pass
+
+
+class BackgroundBusy(BackgroundTransient):
+    #   every worker slot stayed taken for `timeout` seconds
+    pass
+
+
+def _limit_memory(extra_bytes):
+    #   RLIMIT_AS counts the address space inherited from the server too
+    with open('/proc/self/statm') as f:
+        inherited = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    limit = inherited + extra_bytes
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _work(connection, func, args, memory_limit, max_result_bytes):
+    try:
+        if memory_limit and resource is not None and os.path.exists('/proc/self/statm'):
+            _limit_memory(memory_limit)
+        data = pickle.dumps(('ok', func(*args)), pickle.HIGHEST_PROTOCOL)
+        if len(data) > max_result_bytes:
+            data = pickle.dumps(('error', 'result too large ({} bytes)'.format(len(data))))
+    except MemoryError:
+        data = pickle.dumps(('transient', 'out of memory'))
+    except Exception as e:
+        data = pickle.dumps(('error', 'failed: {}'.format(type(e).__name__)))
+    connection.send_bytes(data)
+    connection.close()
+
+
+class BackgroundCallback:
+    def __init__(self, func, timeout=2.0, memory_limit=256 * 2 ** 20,
+                 max_result_bytes=2 ** 20, cache_size=128, placeholder=None):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_result_bytes = max_result_bytes
+        self.cache_size = cache_size
+        self.placeholder = placeholder
+        self.calls = 0
+        self.hits = 0
+        self.runs = 0
+        self.failures = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, args):
+        if not _slots.acquire(timeout=self.timeout):
+            raise BackgroundBusy('busy')
+        try:
+            with self._lock:
+                self.runs += 1
+            receiver, sender = _context.Pipe(duplex=False)
+            worker = _context.Process(target=_work, daemon=True,
+                                      args=(sender, self.func, args,
+                                            self.memory_limit, self.max_result_bytes))
+            worker.start()
+            sender.close()
+            try:
+                if not receiver.poll(self.timeout):
+                    raise BackgroundTransient('timed out after {:g} s'.format(self.timeout))
+                status, value = pickle.loads(receiver.recv_bytes())
+            except EOFError:
+                #   the worker died without answering (e.g. killed by the OS)
+                raise BackgroundTransient('worker died')
+            finally:
+                receiver.close()
+                if worker.is_alive():
+                    worker.kill()
+                worker.join()
+        finally:
+            _slots.release()
+
+        if status == 'transient':
+            raise BackgroundTransient(value)
+        if status != 'ok':
+            raise BackgroundError(value)
+        return value
+
+    def __call__(self, *args):
+        key = hashable_inputs(args)
+        with self._lock:
+            self.calls += 1
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+
+        try:
+            result = self._run(args)
+        except BackgroundError as error:
+            with self._lock:
+                self.failures += 1
+            if self.placeholder is None:
+                raise
+            if isinstance(error, BackgroundTransient):
+                return self.placeholder(error)
+            #   remembered too: the same input would fail the same way
+            result = self.placeholder(error)
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls' : self.calls,
+                'hits' : self.hits,
+                'runs' : self.runs,
+                'failures' : self.failures,
+                'size' : len(self._results),
+            }
+
+
+def run_in_background(timeout=2.0, memory_limit=256 * 2 ** 20, max_result_bytes=2 ** 20,
+                      cache_size=128, placeholder=None):
+    def decorator(func):
+        return BackgroundCallback(func, timeout=timeout, memory_limit=memory_limit,
+                                  max_result_bytes=max_result_bytes, cache_size=cache_size,
+                                  placeholder=placeholder)
+    return decorator
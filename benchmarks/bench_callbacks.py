@@ -0,0 +1,341 @@
+'''
+Callback benchmark suite over synthetic data scaled from 1x to 1000x.
+
+Every demo of `app_callback.py`, `app_graph.py` and `app_layout.py` is built
+through `registry.create_app`, without starting the server and with synthetic
+frames served through `datasets.override`. Each scenario is then run
+
+    direct  --> the callback function called in-process
+    http    --> a POST to `/_dash-update-component` through Flask's test client
+
+and reported as latency percentiles, peak traced memory and response bytes.
+The `/_dash-layout` payload of every demo is measured the same way.
+
+    python benchmarks/bench_callbacks.py                     # run, print a table
+    python benchmarks/bench_callbacks.py --scales 1 10       # smaller run
+    python benchmarks/bench_callbacks.py --save-baseline     # store results
+    python benchmarks/bench_callbacks.py --compare           # fail on regressions
+
+Event debouncing (`coalesce_events`) is disabled (`window = 0`) while
+benchmarking: a call it drops returns no update without running the callback,
+which would skew the call counts and time the drop instead of the work.
+'''
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import datasets
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+from event_throttle import EventCoalescer
+from registry import create_app
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+FERTILITY = 'Fertility rate, total (births per woman)'
+LIFE_EXPECTANCY = 'Life expectancy at birth, total (years)'
+CONTINENTS = ['Asia', 'Europe', 'Africa', 'Americas', 'Oceania']
+
+
+#   --------------------------------------------------------------------------
+#   synthetic data, shaped like the real datasets
+
+def synthetic_frames(scale, seed=0):
+    rng = np.random.default_rng(seed)
+
+    countries = ['Japan'] + ['Country {}'.format(i) for i in range(50 * scale - 1)]
+    indicators = [FERTILITY, LIFE_EXPECTANCY] + ['Indicator {}'.format(i) for i in range(8)]
+    years = np.arange(1962, 2008, 5)
+    n = len(countries) * len(indicators) * len(years)
+    country_indicators = pd.DataFrame({
+        'Country Name' : np.repeat(np.array(countries, dtype=object), len(indicators) * len(years)),
+        'Indicator Name' : np.tile(np.repeat(np.array(indicators, dtype=object), len(years)), len(countries)),
+        'Year' : np.tile(years, len(countries) * len(indicators)),
+        'Value' : rng.random(n) * 100,
+    })
+
+    n_countries = 142 * scale
+    gapminder_years = np.arange(1952, 2008, 5)
+    gapminder = pd.DataFrame({
+        'country' : np.repeat(['C{}'.format(i) for i in range(n_countries)], len(gapminder_years)).astype(object),
+        'year' : np.tile(gapminder_years, n_countries),
+        'pop' : rng.integers(10 ** 5, 10 ** 9, n_countries * len(gapminder_years)),
+        'continent' : np.repeat([CONTINENTS[i % 5] for i in range(n_countries)], len(gapminder_years)).astype(object),
+        'lifeExp' : rng.random(n_countries * len(gapminder_years)) * 80,
+        'gdpPercap' : rng.random(n_countries * len(gapminder_years)) * 40000,
+    })
+
+    n_states = 50 * scale
+    exports = pd.DataFrame({'state' : ['State {}'.format(i) for i in range(n_states)]})
+    for col in ['total exports', 'beef', 'pork', 'poultry', 'dairy', 'fruits fresh',
+                'fruits proc', 'total fruits', 'veggies fresh', 'veggies proc',
+                'total veggies', 'corn', 'wheat', 'cotton']:
+        exports[col] = rng.random(n_states) * 1000
+
+    gdp_life_exp = pd.DataFrame({
+        'country' : ['C{}'.format(i) for i in range(n_countries)],
+        'continent' : [CONTINENTS[i % 5] for i in range(n_countries)],
+        'population' : rng.random(n_countries) * 1e8,
+        'life expectancy' : rng.random(n_countries) * 80,
+        'gdp per capita' : rng.random(n_countries) * 40000,
+    })
+
+    return {
+        'country_indicators' : country_indicators,
+        'gapminder' : gapminder,
+        'usa_agricultural_exports_2011' : exports,
+        'gdp_life_exp_2007' : gdp_life_exp,
+    }
+
+
+#   --------------------------------------------------------------------------
+#   scenarios: (function name, callback arguments, changed input ids)
+
+HOVER = {'points' : [{'customdata' : 'Japan'}]}
+
+DEMOS = {
+    ('app_callback', 1) : [
+        ('update_output_div', ['hello'], ['my-input.value']),
+    ],
+    #   the slider picks prebuilt frames in the browser: layout only
+    ('app_callback', 2) : [],
+    ('app_callback', 3) : [
+        ('update_graph', [FERTILITY, LIFE_EXPECTANCY, 'Linear', 'Linear', 2007, None], ['year--slider.value']),
+        ('update_graph', [FERTILITY, LIFE_EXPECTANCY, 'Log', 'Linear', 2007, None], ['xaxis-type.value']),
+    ],
+    ('app_callback', 4) : [
+        ('callback_a', [5], ['num_multi.value']),
+    ],
+    #   the chain is resolved in one callback (callback_chains.py)
+    ('app_callback', 5) : [
+        ('set_cities_options+set_cities_value+set_display_children',
+         ['Canada', [], 'New York City'], ['countries-radio.value']),
+        ('set_cities_options+set_cities_value+set_display_children',
+         ['Canada', [], 'Toronto'], ['cities-radio.value']),
+    ],
+    ('app_callback', 6) : [
+        ('update_output', [1, 'Montreal', 'Canada'], ['submit-button-state.n_clicks']),
+    ],
+    ('app_callback', 7) : [
+        ('update_output', ['hello'], []),
+    ],
+    ('app_graph', 1) : [
+        ('update_graph', [FERTILITY, LIFE_EXPECTANCY, 'Linear', 'Linear', 2007, None],
+         ['crossfilter--year--slider.value']),
+        ('update_timeseries', [HOVER, FERTILITY, 'Linear', LIFE_EXPECTANCY, 'Linear', None, None],
+         ['crossfilter-indicator-scatter.hoverData']),
+    ],
+    #   testNo 2 runs its callbacks in the browser: layout only
+    ('app_graph', 2) : [],
+    ('app_graph', 3) : [
+        ('callback', [{'range' : {'x' : [0.2, 0.8], 'y' : [0.1, 0.9]}}, None, None], ['g1.selectedData']),
+    ],
+    ('app_layout', 'simple') : [],
+    ('app_layout', 'styling') : [],
+    ('app_layout', 'reusable') : [
+        ('change_page', [0, 1, 0], ['exports-table-next.n_clicks']),
+    ],
+    ('app_layout', 'graph') : [],
+    ('app_layout', 'markdown') : [],
+    ('app_layout', 'dcc') : [],
+}
+
+
+#   --------------------------------------------------------------------------
+#   loading demos and calling callbacks
+
+def load_demo(module, selector):
+    app = create_app(module, selector)
+    for callback in app.callback_map.values():
+        func = callback.get('callback')
+        while func is not None:
+            if isinstance(func, EventCoalescer):
+                func.window = 0
+            func = getattr(func, '__wrapped__', None)
+    return app
+
+
+def find_callback(app, func_name):
+    #   callbacks may be nested in helpers (e.g. tables.paged_table): look them up
+    #   by name through the function Dash wrapped
+    for output, callback in app.callback_map.items():
+        func = getattr(callback['callback'], '__wrapped__', None)
+        if getattr(func, '__name__', None) == func_name:
+            return output, callback, func
+    raise LookupError('{} is not a registered callback'.format(func_name))
+
+
+def split_output(output):
+    #   'id.prop' or '..id1.prop1...id2.prop2..'
+    def parse(part):
+        component_id, prop = part.rsplit('.', 1)
+        return {'id' : component_id, 'property' : prop}
+    if output.startswith('..'):
+        return [parse(part) for part in output[2:-2].split('...')]
+    return parse(output)
+
+
+def request_body(output, callback, args, changed):
+    ids = callback['inputs'] + callback['state']
+    values = [dict(id_, value=value) for id_, value in zip(ids, args)]
+    return {
+        'output' : output,
+        'outputs' : split_output(output),
+        'inputs' : values[:len(callback['inputs'])],
+        'state' : values[len(callback['inputs']):],
+        'changedPropIds' : changed,
+    }
+
+
+def call_direct(app, func, args, changed):
+    #   run with a minimal callback context so `ctx.triggered_id` works, inside
+    #   a request so per-session state (`session_store`) has a session
+    def run():
+        context_value.set(AttributeDict(
+            triggered_inputs=[{'prop_id' : prop_id, 'value' : None} for prop_id in changed]))
+        try:
+            with app.server.test_request_context():
+                return func(*args)
+        except PreventUpdate:
+            return None
+    return contextvars.copy_context().run(run)
+
+
+def reset_state(func):
+    #   repeated identical calls must not be dropped as duplicate events
+    while func is not None:
+        if isinstance(func, EventCoalescer):
+            func.reset()
+        func = getattr(func, '__wrapped__', None)
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {'p50_ms' : round(p50, 4), 'p95_ms' : round(p95, 4), 'p99_ms' : round(p99, 4)}
+
+
+def measure(run, repeat):
+    run()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = percentiles(samples)
+    result['peak_mb'] = round(peak / 2 ** 20, 3)
+    return result
+
+
+def bench_demo(module, selector, scenarios, frames, repeat):
+    results = []
+    with contextlib.ExitStack() as stack:
+        for name, frame in frames.items():
+            stack.enter_context(datasets.override(name, frame))
+
+        start = time.perf_counter()
+        app = load_demo(module, selector)
+        load_ms = (time.perf_counter() - start) * 1000
+        client = app.server.test_client()
+
+        layout = client.get('/_dash-layout')
+        results.append(dict(
+            callback='<layout>', mode='http',
+            bytes=len(layout.data), load_ms=round(load_ms, 2),
+            **measure(lambda: client.get('/_dash-layout'), repeat)))
+
+        for func_name, args, changed in scenarios:
+            output, callback, func = find_callback(app, func_name)
+            body = request_body(output, callback, args, changed)
+
+            def direct():
+                reset_state(func)
+                call_direct(app, func, args, changed)
+
+            def http():
+                reset_state(func)
+                return client.post('/_dash-update-component', json=body)
+
+            response = http()
+            label = '{}[{}]'.format(func_name, ','.join(changed))
+            results.append(dict(callback=label, mode='direct', **measure(direct, repeat)))
+            results.append(dict(callback=label, mode='http', status=response.status_code,
+                                bytes=len(response.data), **measure(http, repeat)))
+    return results
+
+
+#   --------------------------------------------------------------------------
+#   baselines
+
+def result_key(row):
+    return '{module}:{demo}:{scale}x:{callback}:{mode}'.format(**row)
+
+
+def compare(rows, baseline, tolerance):
+    regressions = []
+    for row in rows:
+        previous = baseline.get(result_key(row))
+        if previous and row['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append((result_key(row), previous['p50_ms'], row['p50_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', help='restrict to one module, e.g. app_graph')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative p50 slowdown before --compare fails')
+    args = parser.parse_args()
+
+    rows = []
+    for scale in args.scales:
+        frames = synthetic_frames(scale)
+        for (module, selector), scenarios in DEMOS.items():
+            if args.only and module != args.only:
+                continue
+            for result in bench_demo(module, selector, scenarios, frames, args.repeat):
+                result.update(module=module, demo=selector, scale=scale)
+                rows.append(result)
+                print('{module:<13} {demo!s:<9} {scale:>5}x {callback:<60} {mode:<6} '
+                      'p50 {p50_ms:>9.3f}  p95 {p95_ms:>9.3f}  p99 {p99_ms:>9.3f} ms  '
+                      'peak {peak_mb:>8.2f} MB  {bytes:>10} B'.format(**dict({'bytes' : ''}, **result)),
+                      flush=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({result_key(row) : row for row in rows}, f, indent=2, sort_keys=True)
+        print('baseline written to', args.baseline)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        for key, before, after in regressions:
+            print('REGRESSION {}: p50 {:.3f} ms -> {:.3f} ms'.format(key, before, after))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
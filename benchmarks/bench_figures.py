@@ -0,0 +1,118 @@
+'''
+Per-callback figure build time: Plotly Express path vs `figure_templates`.
+
+Run with `python benchmarks/bench_figures.py [--repeat N]`. Data is synthetic,
+so no dataset download is needed. The px functions below are the figure code the
+callbacks used before the templates were introduced.
+'''
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from figure_templates import CrossfilterScatter, Gapminder, IndicatorScatter, TimeSeries
+
+
+def px_indicator_scatter(x, y, countries, x_title, x_type, y_title, y_type):
+    fig = px.scatter(x=x, y=y, hover_name=countries)
+    fig.update_traces(customdata=countries)
+    fig.update_xaxes(title=x_title, type='linear' if x_type == 'Linear' else 'log')
+    fig.update_yaxes(title=y_title, type='linear' if y_type == 'Linear' else 'log')
+    fig.update_layout(margin={'l':40, 'b':40, 't':10, 'r':0}, hovermode='closest')
+    return fig
+
+
+def px_time_series(years, values, axis_type, title):
+    fig = px.scatter(x=years, y=values, labels={'x' : 'Year', 'y' : 'Value'})
+    fig.update_traces(mode='lines+markers')
+    fig.update_xaxes(showgrid=False)
+    fig.update_yaxes(type='linear' if axis_type == 'Linear' else 'log')
+    fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
+                       xref='paper', yref='paper', showarrow=False, align='left',
+                       text=title)
+    fig.update_layout(height=225, margin={'l':20, 'b':30, 'r':10, 't':10})
+    return fig
+
+
+def px_gapminder(year_df):
+    fig = px.scatter(year_df, x='gdpPercap', y='lifeExp',
+                     size='pop', color='continent', hover_name='country',
+                     log_x=True, size_max=55)
+    fig.update_layout(transition_duration=500)
+    return fig
+
+
+def px_crossfilter(df, x_col, y_col, selectedpoints, selection_bounds):
+    fig = px.scatter(df, x=x_col, y=y_col, text=df.index)
+    fig.update_traces(selectedpoints=selectedpoints,
+                      customdata=df.index,
+                      mode='markers+text',
+                      marker={'color' : 'rgba(0, 116, 217, 0.7)', 'size' : 20},
+                      unselected={'marker' : {'opacity' : 0.3},
+                                  'textfont' : {'color' : 'rgba(0, 0, 0, 0)'}})
+    fig.update_layout(margin={'l':20, 'r':0, 'b':15, 't':5},
+                      dragmode='select', hovermode=False)
+    fig.add_shape(dict(type='rect',
+                       line={'width' : 1, 'dash' : 'dot', 'color' : 'darkgrey'},
+                       **selection_bounds))
+    return fig
+
+
+def cases():
+    rng = np.random.default_rng(0)
+
+    n = 250
+    x, y = rng.random(n), rng.random(n)
+    countries = np.array(['Country {}'.format(i) for i in range(n)], dtype=object)
+    scatter = IndicatorScatter(margin={'l':40, 'b':40, 't':10, 'r':0})
+    yield ('update_graph',
+           lambda: px_indicator_scatter(x, y, countries, 'x', 'Linear', 'y', 'Log'),
+           lambda: scatter.figure(x, y, countries, 'x', 'Linear', 'y', 'Log', customdata=countries))
+
+    years, values = np.arange(1960, 2021), rng.random(61)
+    series = TimeSeries()
+    yield ('create_time_series',
+           lambda: px_time_series(years, values, 'Linear', 'title'),
+           lambda: series.figure(years, values, 'Linear', 'title'))
+
+    gapminder_df = pd.DataFrame({
+        'country' : ['Country {}'.format(i) for i in range(142)],
+        'continent' : [('Asia', 'Europe', 'Africa', 'Americas', 'Oceania')[i % 5] for i in range(142)],
+        'pop' : rng.integers(10 ** 5, 10 ** 9, 142),
+        'lifeExp' : rng.random(142) * 80,
+        'gdpPercap' : rng.random(142) * 40000,
+    })
+    gapminder = Gapminder(gapminder_df)
+    yield ('update_figure',
+           lambda: px_gapminder(gapminder_df),
+           lambda: gapminder.figure(gapminder_df))
+
+    crossfilter_df = pd.DataFrame({'Col 1' : rng.random(30), 'Col 2' : rng.random(30)})
+    crossfilter = CrossfilterScatter(crossfilter_df, 'Col 1', 'Col 2')
+    selected = np.arange(0, 30, 2)
+    bounds = {'x0' : 0.2, 'x1' : 0.8, 'y0' : 0.1, 'y1' : 0.9}
+    yield ('get_figure',
+           lambda: px_crossfilter(crossfilter_df, 'Col 1', 'Col 2', selected, bounds),
+           lambda: crossfilter.figure(selected, bounds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print('{:<20} {:>12} {:>14} {:>9}'.format('callback', 'px (ms)', 'template (ms)', 'speedup'))
+    for name, px_build, template_build in cases():
+        px_ms = min(timeit.repeat(px_build, number=1, repeat=args.repeat)) * 1000
+        template_ms = min(timeit.repeat(template_build, number=1, repeat=args.repeat)) * 1000
+        print('{:<20} {:>12.3f} {:>14.3f} {:>8.0f}x'.format(name, px_ms, template_ms, px_ms / template_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+'''
+Server-side resolution of chained callbacks.
+
+In a chain such as country --> city options --> selected city --> text, Dash
+runs the first callback, sends its output to the browser, and only then does the
+browser request the next link: one round trip per link. A `CallbackChain`
+collects the links with the usual `@chain.callback(Output, Input, State)`
+signature, and `register(app)` installs them as a single callback. It takes the
+inputs of every link and returns the outputs of every link. On each request the
+links run in dependency order, and a link runs when one of its inputs was
+triggered or was produced earlier in the same request (on the initial call,
+every link runs). Values produced in the request are the ones downstream links
+see. Outputs that were not produced are left alone (`no_update`), so one click
+costs one round trip, however deep the chain.
+
+Dash accepts the merged callback even though some props are both its input and
+its output (e.g. the selected city): it never re-triggers a callback with its
+own outputs. `register(app, merge=False)` registers the links as separate
+callbacks instead. Each link is timed as a phase of the merged callback (see
+`instrumentation.phase`).
+'''
+from dash import Input, Output, State, ctx, no_update
+from dash.exceptions import PreventUpdate
+
+from instrumentation import phase
+
+
+class CallbackChain:
+    def __init__(self):
+        self.links = []
+
+    def callback(self, *dependencies):
+        outputs = [d for d in dependencies if isinstance(d, Output)]
+        inputs = [d for d in dependencies if isinstance(d, Input)]
+        states = [d for d in dependencies if isinstance(d, State)]
+
+        def decorator(func):
+            self.links.append((func, outputs, inputs, states))
+            return func
+        return decorator
+
+    def _ordered_links(self):
+        #   producers before consumers
+        producer = {}
+        for i, (func, outputs, inputs, states) in enumerate(self.links):
+            for output in outputs:
+                if str(output) in producer:
+                    raise ValueError('{} is the output of more than one link'.format(output))
+                producer[str(output)] = i
+
+        ordered, state = [], {}
+
+        def visit(i):
+            if state.get(i) == 'done':
+                return
+            if state.get(i) == 'visiting':
+                raise ValueError('the chain has a cycle through {}'.format(self.links[i][0].__name__))
+            state[i] = 'visiting'
+            func, outputs, inputs, states = self.links[i]
+            for dependency in inputs + states:
+                if str(dependency) in producer:
+                    visit(producer[str(dependency)])
+            state[i] = 'done'
+            ordered.append(self.links[i])
+
+        for i in range(len(self.links)):
+            visit(i)
+        return ordered
+
+    def register(self, app, merge=True):
+        if not merge:
+            for func, outputs, inputs, states in self.links:
+                app.callback(*outputs, *inputs, *states)(func)
+            return
+
+        links = self._ordered_links()
+        outputs = [output for link in links for output in link[1]]
+
+        #   every prop some link reads; a prop is an Input if any link listens to it
+        reads, listened = {}, set()
+        for func, _, inputs, states in links:
+            for dependency in inputs + states:
+                reads.setdefault(str(dependency), dependency)
+            listened.update(str(dependency) for dependency in inputs)
+        keys = ([key for key in reads if key in listened]
+                + [key for key in reads if key not in listened])
+        dependencies = [Input(reads[key].component_id, reads[key].component_property)
+                        if key in listened else reads[key] for key in keys]
+
+        def resolve_chain(*args):
+            values = dict(zip(keys, args))
+            changed = None if ctx.triggered_id is None else set(ctx.triggered_prop_ids)
+            produced = {}
+            for func, link_outputs, inputs, states in links:
+                if changed is not None and not any(str(i) in changed for i in inputs):
+                    continue
+                with phase(func.__name__):
+                    try:
+                        result = func(*[produced.get(str(d), values.get(str(d)))
+                                        for d in inputs + states])
+                    except PreventUpdate:
+                        continue
+                results = [result] if len(link_outputs) == 1 else result
+                for output, value in zip(link_outputs, results):
+                    if value is no_update:
+                        continue
+                    produced[str(output)] = value
+                    if changed is not None:
+                        changed.add(str(output))
+
+            if not produced:
+                raise PreventUpdate
+            response = tuple(produced.get(str(output), no_update) for output in outputs)
+            return response if len(outputs) > 1 else response[0]
+
+        resolve_chain.__name__ = '+'.join(link[0].__name__ for link in links)
+        app.callback(*outputs, *dependencies)(resolve_chain)
@@ -0,0 +1,81 @@
+'''
+Vectorized selection engine for the generic crossfilter recipe.
+
+Each graph plots one pair of columns. A box selection on a graph becomes a
+boolean mask over all rows computed in one vectorized comparison, the masks of
+every graph are AND-ed together, and the surviving row numbers are the
+`selectedpoints` shared by all graphs (None while nothing is selected). Column
+extents are computed once at load time, and each graph's last mask is kept so
+that only the graph whose selection changed is recomputed.
+'''
+import threading
+
+import numpy as np
+
+
+class CrossfilterEngine:
+    def __init__(self, df, pairs):
+        #   pairs: {graph id: (x column, y column)}
+        self.pairs = dict(pairs)
+        self.size = len(df)
+        used = {col for pair in self.pairs.values() for col in pair}
+        self.columns = {col : df[col].to_numpy(dtype=float) for col in used}
+        self.extents = {col : (np.nanmin(values), np.nanmax(values))
+                        for col, values in self.columns.items()}
+        self._last_masks = {}
+        self._lock = threading.Lock()
+
+    def _box(self, selection):
+        if selection and selection.get('range'):
+            ranges = selection['range']
+            return ranges['x'][0], ranges['x'][1], ranges['y'][0], ranges['y'][1]
+        return None
+
+    def bounds(self, graph, selection):
+        #   the selection rectangle to draw, or the full data extent
+        box = self._box(selection)
+        if box is None:
+            x_col, y_col = self.pairs[graph]
+            box = self.extents[x_col] + self.extents[y_col]
+        return dict(zip(('x0', 'x1', 'y0', 'y1'), box))
+
+    def mask(self, graph, selection):
+        #   None means "no selection on this graph"
+        box = self._box(selection)
+        if box is None:
+            if selection and selection.get('points'):
+                #   lasso / click selections only come with the points themselves
+                key = ('points', tuple(p['customdata'] for p in selection['points']))
+            else:
+                return None
+        else:
+            key = ('box', box)
+
+        with self._lock:
+            last = self._last_masks.get(graph)
+        if last is not None and last[0] == key:
+            return last[1]
+
+        if key[0] == 'box':
+            x0, x1, y0, y1 = box
+            x, y = (self.columns[col] for col in self.pairs[graph])
+            mask = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        else:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[np.asarray(key[1], dtype=np.intp)] = True
+
+        with self._lock:
+            self._last_masks[graph] = (key, mask)
+        return mask
+
+    def selected_points(self, selections):
+        #   selections: {graph id: selectedData}; returns the row numbers in
+        #   every selection, or None when no graph has a selection
+        combined = None
+        for graph, selection in selections.items():
+            mask = self.mask(graph, selection)
+            if mask is not None:
+                combined = mask.copy() if combined is None else combined & mask
+        if combined is None:
+            return None
+        return np.flatnonzero(combined)
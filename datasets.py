@@ -0,0 +1,222 @@
+'''
+Local columnar cache for the demo datasets.
+
+Every demo used to `pd.read_csv` its data from a URL at import time. Each named
+dataset now resolves to a CSV under `data/` (downloaded once if it is missing).
+On first use the CSV is converted into a directory of typed `.npy` column files
+under `.dataset_cache/<name>/`:
+
+    numeric columns --> one memory-mappable array per column
+    text columns    --> int32 codes + a fixed-width unicode array of categories
+
+Later starts only open the columns a demo asks for. The sha256 of the source
+CSV is kept in `meta.json` and a mismatch rebuilds the cache.
+
+Numeric columns come back as read-only views on the memory-mapped files, so
+every process serving a dataset shares one copy of it through the page cache
+(see `serve.py`).
+
+`source_offset` gives the size of the CSV the cache was built from and
+`read_appended` parses only the rows appended after such an offset (see
+`live_data.py`).
+'''
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('DASHDEMO_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+CACHE_DIR = os.environ.get('DASHDEMO_CACHE_DIR', os.path.join(BASE_DIR, '.dataset_cache'))
+
+DATASETS = {
+    'country_indicators' : {
+        'url' : 'https://plotly.github.io/datasets/country_indicators.csv',
+    },
+    'gapminder' : {
+        'url' : 'https://raw.githubusercontent.com/plotly/datasets/master/gapminderDataFiveYear.csv',
+    },
+    'usa_agricultural_exports_2011' : {
+        'url' : 'https://gist.githubusercontent.com/chriddyp/c78bf172206ce24f77d6363a2d754b59/raw/c353e8ef842413cae56ae3920b8fd78468aa4cb2/usa-agricultural-exports-2011.csv',
+        'index_col' : 0,
+    },
+    'gdp_life_exp_2007' : {
+        'url' : 'https://gist.githubusercontent.com/chriddyp/5d1ea79569ed194d432e56108a04d188/raw/a9f9e8076b837d541398e999dcbac2b2826a81f8/gdp-life-exp-2007.csv',
+        'index_col' : 0,
+    },
+}
+
+_INDEX = '__index__'
+
+#   in-memory frames served instead of the cache (benchmarks)
+_overrides = {}
+
+
+def source_path(name):
+    path = os.path.join(DATA_DIR, name + '.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        urllib.request.urlretrieve(DATASETS[name]['url'], path + '.part')
+        os.replace(path + '.part', path)
+    return path
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(cache):
+    try:
+        with open(os.path.join(cache, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(meta, path):
+    if meta is None:
+        return False
+    if not os.path.exists(path):
+        #   offline with a cache and no CSV: trust the cache
+        return True
+    stat = os.stat(path)
+    if meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime:
+        return True
+    return meta['checksum'] == _checksum(path)
+
+
+def _build_cache(name, path, cache):
+    df = pd.read_csv(path, index_col=DATASETS[name].get('index_col'))
+    index_name = df.index.name
+    if DATASETS[name].get('index_col') is not None:
+        df = df.reset_index(names=_INDEX)
+
+    #   per-process scratch directory: concurrent builders never share one
+    tmp = '{}.tmp{}'.format(cache, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        file = 'c{}'.format(i)
+        series = df[col]
+        if series.dtype.kind in 'biuf':
+            np.save(os.path.join(tmp, file + '.npy'), series.to_numpy())
+            kind = 'numeric'
+        else:
+            codes, categories = pd.factorize(series)
+            np.save(os.path.join(tmp, file + '.npy'), codes.astype(np.int32))
+            np.save(os.path.join(tmp, file + '.cat.npy'), categories.to_numpy().astype(str))
+            kind = 'text'
+        columns.append({'name' : col, 'file' : file, 'kind' : kind})
+
+    stat = os.stat(path)
+    meta = {
+        'checksum' : _checksum(path),
+        'size' : stat.st_size,
+        'mtime' : stat.st_mtime,
+        'index' : index_name,
+        'columns' : columns,
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(cache, ignore_errors=True)
+    os.replace(tmp, cache)
+    return meta
+
+
+def open_cache(name):
+    cache = os.path.join(CACHE_DIR, name)
+    meta = _read_meta(cache)
+    path = os.path.join(DATA_DIR, name + '.csv')
+    if not _is_fresh(meta, path):
+        meta = _build_cache(name, source_path(name), cache)
+    return cache, meta
+
+
+def _load_columns(cache, meta, columns, mmap):
+    wanted = None if columns is None else set(columns) | {_INDEX}
+    arrays = {}
+    for col in meta['columns']:
+        if wanted is not None and col['name'] not in wanted:
+            continue
+        data = np.load(os.path.join(cache, col['file'] + '.npy'),
+                       mmap_mode='r' if mmap else None)
+        if col['kind'] == 'text':
+            categories = np.load(os.path.join(cache, col['file'] + '.cat.npy')).astype(object)
+            data = np.append(categories, np.nan)[data]
+        arrays[col['name']] = data
+    return arrays
+
+
+def prepare(names=None):
+    #   build / validate the caches up front, e.g. once before forking workers
+    for name in DATASETS if names is None else names:
+        open_cache(name)
+
+
+def load_columns(name, columns=None, mmap=True):
+    #   returns {column name: numpy array}; numeric arrays are memory-mapped
+    cache, meta = open_cache(name)
+    return _load_columns(cache, meta, columns, mmap)
+
+
+def source_offset(name):
+    #   bytes of the source CSV the cached columns hold (None: served from memory)
+    if name in _overrides:
+        return None
+    return open_cache(name)[1]['size']
+
+
+def read_appended(name, offset):
+    #   (rows appended to the CSV after byte `offset`, offset after them); a
+    #   line still being written is left for the next call
+    with open(os.path.join(DATA_DIR, name + '.csv'), 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b'\n') + 1
+    if end == 0:
+        return None, offset
+    df = pd.read_csv(io.BytesIO(header + chunk[:end]), index_col=DATASETS[name].get('index_col'))
+    return df, offset + end
+
+
+@contextlib.contextmanager
+def override(name, frame):
+    #   serve `frame` for `name` while the context is active
+    previous = _overrides.get(name)
+    _overrides[name] = frame
+    try:
+        yield frame
+    finally:
+        if previous is None:
+            del _overrides[name]
+        else:
+            _overrides[name] = previous
+
+
+def load_dataset(name, columns=None, mmap=True):
+    if name in _overrides:
+        frame = _overrides[name]
+        return frame if columns is None else frame[list(columns)]
+
+    cache, meta = open_cache(name)
+    arrays = _load_columns(cache, meta, columns, mmap)
+    #   copy=False keeps the numeric columns as views on the memory-mapped files
+    #   instead of consolidating them into a private block
+    df = pd.DataFrame(arrays, columns=[c for c in arrays if c != _INDEX], copy=False)
+    if _INDEX in arrays:
+        df.index = pd.Index(arrays[_INDEX], name=meta['index'])
+    return df
@@ -0,0 +1,112 @@
+'''
+Point-budget downsampling in front of figure construction.
+
+    lttb    --> Largest-Triangle-Three-Buckets, keeps the visual shape of a line
+    minmax  --> per x-bucket min / max of y, keeps the outliers of a scatter
+
+Both return the row positions to keep, so callers can subset every aligned
+array (x, y, hover names, customdata) the same way. `visible_range` reads a
+zoom out of a graph's `relayoutData` so callbacks can re-fetch the zoomed
+window at full resolution.
+'''
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    #   first and last points are always kept, the rest is split in n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[stop:edges[i + 2]].mean(), y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, n_out):
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+
+    n_buckets = max(1, n_out // 2)
+    order = np.argsort(x, kind='stable')
+    bucket = np.arange(n) * n_buckets // n
+
+    #   sort each (equal count) x bucket by y: its first / last entries are the extremes
+    by_y = np.lexsort((np.asarray(y)[order], bucket))
+    starts = np.searchsorted(bucket, np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    keep = np.unique(np.concatenate([by_y[starts], by_y[ends]]))
+    return np.sort(order[keep])
+
+
+def visible_range(relayoutData, axis='xaxis', log=False):
+    #   (low, high) in data units, or None when the axis is auto-ranged
+    if not relayoutData or relayoutData.get(axis + '.autorange'):
+        return None
+    if axis + '.range[0]' in relayoutData:
+        low, high = relayoutData[axis + '.range[0]'], relayoutData[axis + '.range[1]']
+    elif axis + '.range' in relayoutData:
+        low, high = relayoutData[axis + '.range']
+    else:
+        return None
+    if log:
+        #   log axes report their range as powers of ten
+        low, high = 10 ** low, 10 ** high
+    return min(low, high), max(low, high)
+
+
+def is_zoom_event(relayoutData):
+    #   relayoutData also fires for autosize / dragmode changes, which need no data
+    return bool(relayoutData) and any(
+        key.endswith(('.range', '.range[0]', '.range[1]', '.autorange'))
+        for key in relayoutData
+    )
+
+
+def _window(x, x_range):
+    keep = np.isfinite(x)
+    if x_range is not None:
+        keep &= (x >= x_range[0]) & (x <= x_range[1])
+    return np.flatnonzero(keep)
+
+
+def downsample_line(x, y, budget, x_range=None):
+    #   positions of the points to draw for a line, optionally within a zoom window
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rows = _window(x, x_range)
+    rows = rows[np.isfinite(y[rows])]
+    if budget is None:
+        return rows
+    return rows[lttb(x[rows], y[rows], budget)]
+
+
+def downsample_scatter(x, y, budget, x_range=None, y_range=None):
+    #   positions of the points to draw for a scatter, optionally within a zoom window
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rows = _window(x, x_range)
+    rows = rows[np.isfinite(y[rows])]
+    if y_range is not None:
+        rows = rows[(y[rows] >= y_range[0]) & (y[rows] <= y_range[1])]
+    if budget is None:
+        return rows
+    return rows[minmax(x[rows], y[rows], budget)]
@@ -0,0 +1,314 @@
+'''
+Server-side coalescing of high-frequency graph events.
+
+Hover events fire a request for every point the mouse crosses, and many of them
+carry the same payload as the previous one. `coalesce_events` wraps a callback
+so that, per session:
+
+    1.  a call whose inputs equal those of the result the page shows is
+        dropped, unless another call of the page is still waiting or running
+        (the browser keeps the output it already has)
+    2.  calls fired by the same input run one at a time, and a call still
+        waiting when a newer one arrives less than `window` seconds after it
+        is dropped: of a burst, the last call always computes
+
+Calls only wait for a running call fired by the same input, never for a fixed
+time, and calls fired by different inputs (a hover and an axis toggle) never
+drop each other. The browser does keep only the newest response, so a coalesced
+callback checks `replaces_dropped_call()` (below) before taking a shortcut.
+
+Dropped calls raise `PreventUpdate`. `stats()` reports how many invocations
+were suppressed.
+
+Dragging a slider does not repeat inputs; it produces a burst of distinct ones,
+of which only the last result is ever shown. `latest_wins` numbers the calls of
+a callback per session: calls for one session run one at a time, a call that
+has been superseded by a newer one while it waited is dropped before it starts,
+and a running call stops at the next `checkpoint()` (placed between its
+filtering and figure-building phases) once a newer call has arrived. Page loads
+are never dropped. `stats()` counts the skipped and cancelled calls and the
+seconds of work thrown away.
+
+A newer call only replaces an older one if it delivers everything the older one
+would have. A callback with shortcuts (a layout-only Patch for an axis toggle,
+`no_update` for a pan) asks `replaces_dropped_call()` first: it is True while an
+earlier call of the session is still waiting or running, or was dropped since
+the last call that completed, and the callback then takes its full path.
+
+A session is one page: `install_session_key(app)` hands every browser the
+`session_store` cookie and has every page send a random id of its own with its
+callback requests. Two browsers behind one address (or one proxy), and two tabs
+of one browser, never drop or queue each other's calls.
+'''
+import functools
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from dash import ctx
+from dash.exceptions import PreventUpdate
+from flask import has_request_context, request
+
+from figure_cache import hashable_inputs
+from session_store import install_session_cookie, session_token
+
+#   the field of the callback request body holding the page id
+PAGE_FIELD = 'dashdemoPage'
+
+_RENDERER = '''
+var dashdemoPage = Math.random().toString(36).slice(2) + Date.now().toString(36);
+var renderer = new DashRenderer({
+    request_pre: function(payload) { payload.%s = dashdemoPage; }
+});
+''' % PAGE_FIELD
+
+
+def install_session_key(app):
+    install_session_cookie(app)
+    app.renderer = _RENDERER
+
+
+def default_session_key():
+    #   the browser's session cookie and the page making the request (see
+    #   `install_session_key`)
+    if not has_request_context():
+        return None
+    body = request.get_json(silent=True)
+    return session_token(), body.get(PAGE_FIELD) if isinstance(body, dict) else None
+
+
+def _is_initial_call():
+    #   page (re)loads resend the same inputs and must never be dropped
+    return not has_request_context() or ctx.triggered_id is None
+
+
+def _trigger():
+    #   the inputs that fired the current callback
+    if not has_request_context():
+        return None
+    return tuple(sorted(ctx.triggered_prop_ids))
+
+
+class EventCoalescer:
+    def __init__(self, func, window=0.05, session_key=default_session_key, max_sessions=10000):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.window = window
+        self.session_key = session_key
+        self.max_sessions = max_sessions
+        self.calls = 0
+        self.duplicates = 0
+        self.debounced = 0
+        #   session --> [calls waiting or running, latest ticket, inputs of the
+        #                result the page shows (None: unknown), a call was
+        #                dropped since the page last got a result]
+        self._sessions = OrderedDict()
+        #   (session, trigger) --> [latest ticket, its arrival time, lock held
+        #                           by the running call]
+        self._latest = OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _trim(entries, key, limit):
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def _superseded(self, session, ticket):
+        with self._lock:
+            state = self._sessions.get(session)
+            return state is not None and state[1] != ticket
+
+    def __call__(self, *args):
+        if _is_initial_call():
+            return self.func(*args)
+
+        session = self.session_key()
+        key = (session, _trigger())
+        inputs = hashable_inputs(args)
+        arrived = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            state = self._sessions.setdefault(session, [0, None, None, False])
+            #   the browser drops the response of a call once a newer one is
+            #   fired: only a result it kept makes a repeat a duplicate
+            if state[0] == 0 and state[2] == inputs:
+                self.duplicates += 1
+                raise PreventUpdate
+            ticket = next(self._sequence)
+            replaces = state[0] > 0 or state[3]
+            state[0] += 1
+            state[1] = ticket
+            self._trim(self._sessions, session, self.max_sessions)
+            entry = self._latest.setdefault(key, [ticket, arrived, threading.Lock()])
+            entry[0], entry[1] = ticket, arrived
+            self._trim(self._latest, key, self.max_sessions)
+
+        delivered = False
+        try:
+            with entry[2]:
+                with self._lock:
+                    if entry[0] != ticket and entry[1] - arrived < self.window:
+                        self.debounced += 1
+                        raise PreventUpdate
+
+                previous = getattr(_current, 'call', None)
+                _current.call = (self, session, ticket, replaces)
+                try:
+                    result = self.func(*args)
+                finally:
+                    _current.call = previous
+                delivered = True
+                return result
+        finally:
+            with self._lock:
+                state[0] -= 1
+                if state[1] == ticket:
+                    #   the newest call: its result is what the page shows
+                    state[2] = inputs if delivered else None
+                    state[3] = not delivered
+                elif not delivered:
+                    state[3] = True
+
+    def reset(self):
+        with self._lock:
+            self._sessions.clear()
+            self._latest.clear()
+            self.calls = self.duplicates = self.debounced = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls' : self.calls,
+                'duplicates' : self.duplicates,
+                'debounced' : self.debounced,
+                'suppressed' : self.duplicates + self.debounced,
+            }
+
+
+def coalesce_events(window=0.05, session_key=default_session_key):
+    def decorator(func):
+        return EventCoalescer(func, window=window, session_key=session_key)
+    return decorator
+
+
+class _Superseded(PreventUpdate):
+    pass
+
+
+_current = threading.local()
+
+
+def checkpoint():
+    #   inside a `latest_wins` or `coalesce_events` callback: stop here if a
+    #   newer call has arrived
+    call = getattr(_current, 'call', None)
+    if call is not None:
+        wrapper, session, ticket, replaces = call
+        if wrapper._superseded(session, ticket):
+            raise _Superseded
+
+
+def replaces_dropped_call():
+    #   inside a `latest_wins` or `coalesce_events` callback: True when this
+    #   call may stand in for an earlier one that is dropped, so it must not
+    #   take a shortcut
+    call = getattr(_current, 'call', None)
+    return call is not None and call[3]
+
+
+class LatestWins:
+    def __init__(self, func, session_key=default_session_key, max_sessions=10000):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.session_key = session_key
+        self.max_sessions = max_sessions
+        self.calls = 0
+        self.completed = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.wasted_seconds = 0.0
+        #   session --> [latest ticket, lock held by the running call,
+        #                calls waiting or running, a call was dropped since
+        #                the last one completed]
+        self._sessions = OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _superseded(self, session, ticket):
+        with self._lock:
+            entry = self._sessions.get(session)
+            return entry is not None and entry[0] != ticket
+
+    def __call__(self, *args):
+        if _is_initial_call():
+            return self.func(*args)
+
+        session = self.session_key()
+        with self._lock:
+            self.calls += 1
+            ticket = next(self._sequence)
+            entry = self._sessions.setdefault(session, [ticket, threading.Lock(), 0, False])
+            entry[0] = ticket
+            #   counted on arrival: the older call may be dropped after this
+            #   one has started
+            replaces = entry[2] > 0 or entry[3]
+            entry[2] += 1
+            self._sessions.move_to_end(session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        try:
+            with entry[1]:
+                if self._superseded(session, ticket):
+                    with self._lock:
+                        self.skipped += 1
+                        entry[3] = True
+                    raise PreventUpdate
+
+                previous = getattr(_current, 'call', None)
+                _current.call = (self, session, ticket, replaces)
+                start = time.perf_counter()
+                try:
+                    result = self.func(*args)
+                except _Superseded:
+                    with self._lock:
+                        self.cancelled += 1
+                        self.wasted_seconds += time.perf_counter() - start
+                        entry[3] = True
+                    raise
+                finally:
+                    _current.call = previous
+
+                with self._lock:
+                    self.completed += 1
+                    entry[3] = False
+                return result
+        finally:
+            with self._lock:
+                entry[2] -= 1
+
+    def reset(self):
+        with self._lock:
+            self._sessions.clear()
+            self.calls = self.completed = self.skipped = self.cancelled = 0
+            self.wasted_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls' : self.calls,
+                'completed' : self.completed,
+                'skipped' : self.skipped,
+                'cancelled' : self.cancelled,
+                'dropped' : self.skipped + self.cancelled,
+                'wasted_seconds' : round(self.wasted_seconds, 6),
+            }
+
+
+def latest_wins(session_key=default_session_key):
+    def decorator(func):
+        return LatestWins(func, session_key=session_key)
+    return decorator
@@ -0,0 +1,86 @@
+'''
+Memoization layer for figure callbacks.
+
+Callbacks such as the gapminder `update_figure` only ever see a handful of
+distinct inputs (one per slider mark), yet rebuild a Plotly Express figure on
+every call. Wrapping them with `memoize_figure` keeps the built figures in a
+bounded LRU keyed on the callback inputs, so repeated inputs become a dictionary
+lookup. `warm_up` precomputes a known set of inputs at startup, `discard`
+forgets the figure of inputs whose data changed and `cache_info` reports
+hit / miss counters.
+
+Cached figures are shared between requests, so a memoized callback must not
+mutate the figure it returns after the fact.
+'''
+import functools
+import threading
+from collections import OrderedDict
+
+
+def hashable_inputs(value):
+    #   callback inputs may be lists / dicts (e.g. hoverData): make them hashable
+    if isinstance(value, dict):
+        return tuple(sorted((k, hashable_inputs(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable_inputs(v) for v in value)
+    return value
+
+
+class FigureCache:
+    def __init__(self, func, maxsize=32):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        key = hashable_inputs(args)
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key]
+            self.misses += 1
+
+        fig = self.func(*args)
+
+        with self._lock:
+            self._figures[key] = fig
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return fig
+
+    def warm_up(self, inputs):
+        #   each item is the argument tuple of one call (or a single argument)
+        for args in inputs:
+            self(*(args if isinstance(args, tuple) else (args,)))
+
+    def cache_info(self):
+        with self._lock:
+            return {
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'size' : len(self._figures),
+                'maxsize' : self.maxsize,
+            }
+
+    def discard(self, *args):
+        #   drop the figure of one set of inputs, e.g. after its data changed
+        with self._lock:
+            self._figures.pop(hashable_inputs(args), None)
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def memoize_figure(maxsize=32):
+    def decorator(func):
+        return FigureCache(func, maxsize=maxsize)
+    return decorator
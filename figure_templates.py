@@ -0,0 +1,229 @@
+'''
+Pre-built figure skeletons for the callbacks.
+
+`px.scatter` followed by `update_traces` / `update_xaxes` / `update_layout`
+validates the whole figure object tree on every call. Each chart here runs that
+Plotly Express pipeline once, at load time, and keeps the resulting figure as a
+plain dict. Per request only the data arrays and the few layout properties that
+depend on the inputs are merged into a shallow copy of that dict, which Dash
+serializes as-is.
+
+Skeletons are shared between requests and must never be mutated: `_merge`
+copies every dict / list along an overridden path and shares the rest.
+
+See `benchmarks/bench_figures.py` for build times against the px path.
+'''
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import Patch
+
+from raster import rasterize
+
+
+def _merge(base, overrides):
+    #   overrides for a list are given as {index: overrides}
+    if isinstance(base, list):
+        merged = list(base)
+        for i, value in overrides.items():
+            merged[i] = _merge(base[i], value) if isinstance(value, dict) else value
+        return merged
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), (dict, list)):
+            merged[key] = _merge(base[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def axis_type(value):
+    return 'linear' if value == 'Linear' else 'log'
+
+
+class FigureTemplate:
+    def __init__(self, fig):
+        self.skeleton = fig.to_dict()
+
+    def render(self, data=None, layout=None):
+        return {
+            'data' : _merge(self.skeleton['data'], data or {}),
+            'layout' : _merge(self.skeleton['layout'], layout or {}),
+        }
+
+
+class IndicatorScatter(FigureTemplate):
+    #   `update_graph`: one indicator against another, one marker per country
+    def __init__(self, margin):
+        fig = px.scatter(x=[0.0], y=[0.0], hover_name=[''])
+        fig.update_layout(margin=margin, hovermode='closest')
+        super().__init__(fig)
+
+    def _axes(self, x_title, x_type, y_title, y_type, uirevision):
+        return {
+            'xaxis' : {'title' : {'text' : x_title}, 'type' : axis_type(x_type)},
+            'yaxis' : {'title' : {'text' : y_title}, 'type' : axis_type(y_type)},
+            'uirevision' : uirevision,
+        }
+
+    def figure(self, x, y, countries, x_title, x_type, y_title, y_type,
+               customdata=None, uirevision=None):
+        trace = {'x' : x, 'y' : y, 'hovertext' : countries}
+        if len(x) > 1000:
+            #   same switch as Plotly Express' automatic render mode
+            trace['type'] = 'scattergl'
+        if customdata is not None:
+            trace['customdata'] = customdata
+        return self.render({0 : trace}, self._axes(x_title, x_type, y_title, y_type, uirevision))
+
+    def density(self, raster, x_title, x_type, y_title, y_type,
+                labels=None, uirevision=None):
+        #   a `raster.rasterize` grid instead of the points: one heatmap trace
+        counts, x, y, first = raster
+        trace = {
+            'type' : 'heatmap',
+            'x' : x,
+            'y' : y,
+            'z' : counts,
+            'colorscale' : 'Blues',
+            'showscale' : False,
+            'hoverongaps' : False,
+            'hovertemplate' : '%{z} points<extra></extra>',
+        }
+        if labels is not None:
+            #   each cell answers hovers as one of its points
+            trace['customdata'] = np.where(first >= 0, np.asarray(labels, dtype=object)[first], None)
+            trace['hovertemplate'] = '%{customdata}<br>%{z} points<extra></extra>'
+        layout = self.render(layout=self._axes(x_title, x_type, y_title, y_type, uirevision))['layout']
+        return {'data' : [trace], 'layout' : layout}
+
+
+class TimeSeries(FigureTemplate):
+    #   `create_time_series`: one indicator of one country over the years
+    def __init__(self):
+        fig = px.scatter(x=[0], y=[0.0], labels={'x' : 'Year', 'y' : 'Value'})
+        fig.update_traces(mode='lines+markers')
+        fig.update_xaxes(showgrid=False)
+        fig.add_annotation(x=0, y=0.85, xanchor='left', yanchor='bottom',
+                           xref='paper', yref='paper', showarrow=False, align='left',
+                           text='')
+        fig.update_layout(height=225, margin={'l':20, 'b':30, 'r':10, 't':10})
+        super().__init__(fig)
+
+    def figure(self, years, values, y_type, title):
+        return self.render({0 : {'x' : years, 'y' : values}}, {
+            'yaxis' : {'type' : axis_type(y_type)},
+            'annotations' : {0 : {'text' : title}},
+            'uirevision' : title,
+        })
+
+
+class Gapminder(FigureTemplate):
+    #   `update_figure`: one bubble per country, one trace per continent
+    def __init__(self, df, size_max=55):
+        #   SVG whatever the number of rows: above 1000, px would switch to
+        #   WebGL, which ignores `transition_duration`
+        fig = px.scatter(df, x='gdpPercap', y='lifeExp',
+                         size='pop', color='continent', hover_name='country',
+                         log_x=True, size_max=size_max, render_mode='svg')
+        fig.update_layout(transition_duration=500)
+        super().__init__(fig)
+        assert all(trace['type'] == 'scatter' for trace in self.skeleton['data'])
+        self.size_max = size_max
+        self.continents = [trace['name'] for trace in self.skeleton['data']]
+
+    def figure(self, year_df):
+        #   Plotly Express scales bubble areas to the largest population shown
+        sizeref = year_df['pop'].max() / self.size_max ** 2
+        continent = year_df['continent'].to_numpy()
+        data = {}
+        for i, name in enumerate(self.continents):
+            rows = np.flatnonzero(continent == name)
+            data[i] = {
+                'x' : year_df['gdpPercap'].to_numpy()[rows],
+                'y' : year_df['lifeExp'].to_numpy()[rows],
+                'hovertext' : year_df['country'].to_numpy()[rows],
+                'marker' : {'size' : year_df['pop'].to_numpy()[rows], 'sizeref' : sizeref},
+            }
+        return self.render(data)
+
+    def frames(self, df, values, frame_col='year'):
+        #   one animation frame per value, each built as by `figure`
+        return [{'name' : str(value), 'data' : self.figure(df[df[frame_col] == value])['data']}
+                for value in values]
+
+    def animation(self, df, frame_col='year'):
+        #   one figure holding a frame per year
+        frames = self.frames(df, np.unique(df[frame_col].to_numpy()), frame_col)
+        return {'data' : frames[0]['data'], 'layout' : self.skeleton['layout'], 'frames' : frames}
+
+
+class CrossfilterScatter(FigureTemplate):
+    #   `get_figure`: the plotted rows never change, only the selection does.
+    #   Above `raster_threshold` rows both are drawn as density heatmaps (see
+    #   `raster.py`): all rows faintly, the selected rows on top
+    def __init__(self, df, x_col, y_col, raster_threshold=None, raster_shape=(150, 150)):
+        self.rasterized = raster_threshold is not None and len(df) > raster_threshold
+        if self.rasterized:
+            self.x = df[x_col].to_numpy(dtype=float)
+            self.y = df[y_col].to_numpy(dtype=float)
+            self.raster_shape = raster_shape
+            #   one grid for both layers, whatever the selection
+            self.x_range = (np.nanmin(self.x), np.nanmax(self.x))
+            self.y_range = (np.nanmin(self.y), np.nanmax(self.y))
+            self.counts, x, y, first = rasterize(self.x, self.y, self.x_range, self.y_range, raster_shape)
+            layer = {'x' : x, 'y' : y, 'showscale' : False, 'hoverinfo' : 'skip'}
+            fig = go.Figure([
+                go.Heatmap(z=self.counts, colorscale=[[0, 'rgba(0, 116, 217, 0.1)'],
+                                                 [1, 'rgba(0, 116, 217, 0.3)']], **layer),
+                go.Heatmap(z=self.counts, colorscale=[[0, 'rgba(0, 116, 217, 0.5)'],
+                                                 [1, 'rgba(0, 116, 217, 1)']], **layer),
+            ])
+            fig.update_xaxes(title_text=x_col)
+            fig.update_yaxes(title_text=y_col)
+        else:
+            #   (point labels are only drawn while they stay readable)
+            labelled = len(df) <= 1000
+            fig = px.scatter(df, x=x_col, y=y_col, text=df.index if labelled else None)
+            fig.update_traces(customdata=df.index,
+                              mode='markers+text' if labelled else 'markers',
+                              marker={
+                                  'color' : 'rgba(0, 116, 217, 0.7)',
+                                  'size' : 20 if labelled else 4
+                              },
+                              unselected={
+                                  'marker' : {'opacity' : 0.3},
+                                  'textfont' : {'color' : 'rgba(0, 0, 0, 0)'}
+                              })
+        fig.update_layout(
+            margin={'l':20, 'r':0, 'b':15, 't':5},
+            dragmode='select', hovermode=False
+        )
+        fig.add_shape(dict(type='rect',
+                           line={'width' : 1, 'dash' : 'dot', 'color' : 'darkgrey'},
+                           x0=0, x1=0, y0=0, y1=0))
+        super().__init__(fig)
+
+    def _selected(self, selectedpoints):
+        #   trace overrides for the selected rows (None: no selection)
+        if not self.rasterized:
+            return {0 : {'selectedpoints' : selectedpoints}}
+        if selectedpoints is None:
+            return {1 : {'z' : self.counts}}
+        counts = rasterize(self.x[selectedpoints], self.y[selectedpoints],
+                           self.x_range, self.y_range, self.raster_shape)[0]
+        return {1 : {'z' : counts}}
+
+    def figure(self, selectedpoints, selection_bounds):
+        return self.render(self._selected(selectedpoints), {'shapes' : {0 : selection_bounds}})
+
+    def patch(self, selectedpoints, selection_bounds):
+        #   the same changes for a graph already showing the figure: the
+        #   skeleton is not sent again
+        patch = Patch()
+        for i, trace in self._selected(selectedpoints).items():
+            for key, value in trace.items():
+                patch['data'][i][key] = value
+        for key, value in selection_bounds.items():
+            patch['layout']['shapes'][0][key] = value
+        return patch
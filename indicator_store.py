@@ -0,0 +1,115 @@
+'''
+Pre-indexed view of the long-form `country_indicators` data frame.
+
+The frame has one row per (Country Name, Indicator Name, Year). The crossfilter
+callbacks only ever ask for "indicator A against indicator B in year N", so the
+frame is pivoted once at load time into one country-aligned row per
+(Year, Indicator Name). A callback then fetches its x / y / country vectors with
+a dictionary lookup instead of boolean-masking every row of the frame, and x and
+y are aligned by country by construction.
+
+`append(rows)` folds rows added to the frame later (see `live_data.py`) into the
+index without pivoting the whole frame again, and returns the
+(Year, Indicator Name) keys they touched.
+'''
+import numpy as np
+
+
+def _pivot(df):
+    #   one row per (Year, Indicator Name), one column per country
+    return (df.groupby(['Year', 'Indicator Name', 'Country Name'])['Value']
+              .first()
+              .unstack('Country Name'))
+
+
+class IndicatorStore:
+    def __init__(self, df):
+        table = _pivot(df)
+        #   replaced as a whole by `append`, so readers never mix old and new arrays
+        self._index = (table.columns.to_numpy(dtype=object),
+                       table.to_numpy(dtype=float),
+                       {key : i for i, key in enumerate(table.index.tolist())},
+                       np.full(len(table.columns), np.nan))
+
+    @property
+    def countries(self):
+        return self._index[0]
+
+    @property
+    def values(self):
+        return self._index[1]
+
+    @staticmethod
+    def _row(index, year, indicator):
+        countries, values, rows, missing = index
+        i = rows.get((year, indicator))
+        return missing if i is None else values[i]
+
+    def row(self, year, indicator):
+        #   country-aligned values of one indicator in one year (NaN if missing)
+        return self._row(self._index, year, indicator)
+
+    def scatter(self, year, x_indicator, y_indicator):
+        index = self._index
+        x = self._row(index, year, x_indicator)
+        y = self._row(index, year, y_indicator)
+        keep = ~(np.isnan(x) | np.isnan(y))
+        return x[keep], y[keep], index[0][keep]
+
+    def append(self, df):
+        countries, values, rows, missing = self._index
+        table = _pivot(df)
+        keys = table.index.tolist()
+
+        known_countries = set(countries.tolist())
+        new_countries = [c for c in table.columns if c not in known_countries]
+        new_keys = [key for key in keys if key not in rows]
+        values = np.pad(values, ((0, len(new_keys)), (0, len(new_countries))),
+                        constant_values=np.nan)
+        if new_countries:
+            countries = np.concatenate([countries, np.asarray(new_countries, dtype=object)])
+            missing = np.full(len(countries), np.nan)
+        if new_keys:
+            rows = dict(rows)
+            first = len(rows)
+            rows.update((key, first + i) for i, key in enumerate(new_keys))
+
+        #   as a full rebuild would: the first value of a cell stays
+        position = {country : i for i, country in enumerate(countries.tolist())}
+        columns = np.asarray([position[c] for c in table.columns])
+        for key, new_values in zip(keys, table.to_numpy(dtype=float)):
+            current = values[rows[key], columns]
+            fill = np.isnan(current) & ~np.isnan(new_values)
+            values[rows[key], columns[fill]] = new_values[fill]
+
+        self._index = (countries, values, rows, missing)
+        return set(keys)
+
+
+class TimeSeriesIndex:
+    def __init__(self, df):
+        #   (Country Name, Indicator Name) --> Year-sorted (years, values) arrays
+        self._series = self._split(df)
+        self._empty = (df['Year'].to_numpy()[:0], df['Value'].to_numpy(dtype=float)[:0])
+
+    @staticmethod
+    def _split(df):
+        df = df.sort_values(['Country Name', 'Indicator Name', 'Year'])
+        years = df['Year'].to_numpy()
+        values = df['Value'].to_numpy(dtype=float)
+        positions = df.groupby(['Country Name', 'Indicator Name'], sort=False).indices
+        return {key : (years[pos], values[pos]) for key, pos in positions.items()}
+
+    def series(self, country, indicator):
+        return self._series.get((country, indicator), self._empty)
+
+    def append(self, df):
+        #   only the series the new rows belong to are merged and re-sorted
+        added = self._split(df)
+        for key, (years, values) in added.items():
+            old_years, old_values = self.series(*key)
+            years = np.concatenate([old_years, years])
+            values = np.concatenate([old_values, values])
+            order = np.argsort(years, kind='stable')
+            self._series[key] = (years[order], values[order])
+        return set(added)
@@ -0,0 +1,240 @@
+'''
+Per-callback instrumentation with a Prometheus `/metrics` endpoint.
+
+`instrument(app)` must be called right after the Dash app is created. From then
+on every `@app.callback` is wrapped to record
+
+    invocations, errors and PreventUpdate counts
+    wall time, split in phases:
+        callback        --> the whole callback function
+        <name>          --> any `with phase('<name>'):` block inside it
+                            (the figure callbacks use 'filter' and 'build')
+        encode          --> JSON encoding of the response (see `serialization`)
+        compress        --> response compression (see `serialization`)
+        serialize       --> the rest of the request: Dash dispatch (and JSON
+                            encoding when `serialization` is not in use)
+    request and response payload bytes, the latter before and after compression
+
+and the numbers are served as Prometheus text on `/metrics`.
+
+With `profile_sample_rate` > 0, that fraction of calls run under cProfile (or
+pyinstrument when installed and `profiler='pyinstrument'`); the `profile_slowest`
+slowest profiled calls are kept and served on `/metrics/profiles`.
+'''
+import contextlib
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+
+import flask
+from dash.exceptions import PreventUpdate
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def phase(name):
+    #   time a block of the running callback; a no-op outside instrumented calls
+    timings = getattr(_local, 'timings', None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] += time.perf_counter() - start
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class CallbackMetrics:
+    def __init__(self, profile_sample_rate=0.0, profile_slowest=5, profiler='cprofile'):
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_slowest = profile_slowest
+        self.profiler = profiler
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.prevented = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.max_seconds = defaultdict(float)
+        self.request_bytes = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+        self.uncompressed_bytes = defaultdict(int)
+        self.profiles = []
+        self._tiebreak = itertools.count()
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def instrumented(*args, **kwargs):
+            _local.timings = timings = defaultdict(float)
+            profiler = self._start_profiler()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except PreventUpdate:
+                with self._lock:
+                    self.prevented[name] += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self.errors[name] += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                if profiler is not None:
+                    self._keep_profile(name, elapsed, profiler)
+                timings['callback'] += elapsed
+                _local.timings = None
+                self._record(name, timings, elapsed)
+                if flask.has_request_context():
+                    flask.g.instrumented_callback = (name, elapsed)
+
+        return instrumented
+
+    def _record(self, name, timings, elapsed):
+        with self._lock:
+            self.calls[name] += 1
+            self.max_seconds[name] = max(self.max_seconds[name], elapsed)
+            for phase_name, seconds in timings.items():
+                self.seconds[name, phase_name] += seconds
+
+    def before_request(self):
+        flask.g.instrumented_start = time.perf_counter()
+
+    def after_request(self, response):
+        called = flask.g.pop('instrumented_callback', None)
+        start = flask.g.pop('instrumented_start', None)
+        if called is None or start is None:
+            return response
+        name, callback_seconds = called
+        encode_seconds = flask.g.pop('encode_seconds', 0.0)
+        compress_seconds = flask.g.pop('compress_seconds', 0.0)
+        response_bytes = response.calculate_content_length() or 0
+        uncompressed_bytes = flask.g.pop('compression', (response_bytes,))[0]
+        rest = time.perf_counter() - start - callback_seconds - encode_seconds - compress_seconds
+        with self._lock:
+            if encode_seconds:
+                self.seconds[name, 'encode'] += encode_seconds
+            if compress_seconds:
+                self.seconds[name, 'compress'] += compress_seconds
+            self.seconds[name, 'serialize'] += max(0.0, rest)
+            self.request_bytes[name] += flask.request.content_length or 0
+            self.response_bytes[name] += response_bytes
+            self.uncompressed_bytes[name] += uncompressed_bytes
+        return response
+
+    #   profiling ----------------------------------------------------------
+
+    def _start_profiler(self):
+        if not self.profile_sample_rate or random.random() >= self.profile_sample_rate:
+            return None
+        if self.profiler == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                pass
+            else:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _keep_profile(self, name, elapsed, profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+            report = out.getvalue()
+        else:
+            profiler.stop()
+            report = profiler.output_text()
+
+        entry = (elapsed, next(self._tiebreak), name, report)
+        with self._lock:
+            if len(self.profiles) < self.profile_slowest:
+                heapq.heappush(self.profiles, entry)
+            elif self.profiles and elapsed > self.profiles[0][0]:
+                heapq.heapreplace(self.profiles, entry)
+
+    #   exposition ---------------------------------------------------------
+
+    def prometheus_text(self):
+        with self._lock:
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for labels, value in samples:
+                    label_text = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels)
+                    lines.append('{}{{{}}} {}'.format(name, label_text, value))
+
+            metric('dash_callback_calls_total', 'counter', 'Callback invocations.',
+                   [((('callback', n),), v) for n, v in sorted(self.calls.items())])
+            metric('dash_callback_errors_total', 'counter', 'Callbacks that raised an exception.',
+                   [((('callback', n),), v) for n, v in sorted(self.errors.items())])
+            metric('dash_callback_prevented_total', 'counter', 'Callbacks that raised PreventUpdate.',
+                   [((('callback', n),), v) for n, v in sorted(self.prevented.items())])
+            metric('dash_callback_phase_seconds_total', 'counter', 'Wall time per callback phase.',
+                   [((('callback', n), ('phase', p)), round(v, 6))
+                    for (n, p), v in sorted(self.seconds.items())])
+            metric('dash_callback_max_seconds', 'gauge', 'Slowest single callback run.',
+                   [((('callback', n),), round(v, 6)) for n, v in sorted(self.max_seconds.items())])
+            metric('dash_callback_request_bytes_total', 'counter', 'Callback request payload bytes.',
+                   [((('callback', n),), v) for n, v in sorted(self.request_bytes.items())])
+            metric('dash_callback_response_bytes_total', 'counter', 'Callback response payload bytes, as sent.',
+                   [((('callback', n),), v) for n, v in sorted(self.response_bytes.items())])
+            metric('dash_callback_response_uncompressed_bytes_total', 'counter',
+                   'Callback response payload bytes before compression.',
+                   [((('callback', n),), v) for n, v in sorted(self.uncompressed_bytes.items())])
+            metric('dash_callback_compression_ratio', 'gauge',
+                   'Uncompressed over sent response bytes, over all calls.',
+                   [((('callback', n),), round(v / self.response_bytes[n], 3))
+                    for n, v in sorted(self.uncompressed_bytes.items()) if self.response_bytes[n]])
+        return '\n'.join(lines) + '\n'
+
+    def profiles_text(self):
+        with self._lock:
+            profiles = sorted(self.profiles, reverse=True)
+        return '\n'.join('=== {} ({:.1f} ms) ===\n{}'.format(name, elapsed * 1000, report)
+                         for elapsed, _, name, report in profiles)
+
+
+def instrument(app, profile_sample_rate=0.0, profile_slowest=5, profiler='cprofile'):
+    metrics = CallbackMetrics(profile_sample_rate, profile_slowest, profiler)
+
+    register = app.callback
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def instrumented_decorator(func):
+            decorator(metrics.wrap(func))
+            return func
+        return instrumented_decorator
+
+    app.callback = callback
+
+    server = app.server
+    server.before_request(metrics.before_request)
+    server.after_request(metrics.after_request)
+    server.add_url_rule('/metrics', 'metrics',
+                        lambda: flask.Response(metrics.prometheus_text(),
+                                               mimetype='text/plain; version=0.0.4'))
+    server.add_url_rule('/metrics/profiles', 'metrics_profiles',
+                        lambda: flask.Response(metrics.profiles_text(), mimetype='text/plain'))
+    return metrics
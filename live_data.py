@@ -0,0 +1,146 @@
+'''
+Datasets that pick up rows appended to their source CSV while the app runs.
+
+`load_dataset` reads a dataset once, so new rows used to mean a restart. A
+`LiveDataset` starts from the same cached columns and remembers how many bytes
+of `data/<name>.csv` they cover. `poll()` checks the file size (at most once
+every `min_interval` seconds) and parses only what was appended since:
+
+    live = LiveDataset('gapminder', columns=[...])
+    live.on_append(indicators.append)   # keep derived indexes in step
+    live.select('year', [1952, 2007])   # the current rows of some years
+    live.unique('year')                 # the distinct values of a column
+    live.changes_since(version)         # rows added after `version`
+
+New rows are kept as chunks next to the frame read at startup, which stays the
+memory-mapped frame that `load_dataset` shares between workers. `select` and
+`unique` look at each part in turn and copy only what they return; `frame`
+joins the parts into one frame, once per batch, for code that needs it whole.
+
+The version of the data is the byte offset read up to, so it means the same in
+every worker process of `serve.py`. A page remembers the version its data came
+from in a `dcc.Store`, and a `dcc.Interval` callback asks for the rows added
+since then, so only changed data is sent to open graphs. The last `history`
+batches are kept; a page older than that gets None and reloads everything it
+shows.
+
+Appending is the only change followed: a CSV that shrank or was rewritten is
+picked up by the next restart, which rebuilds the column cache. Datasets served
+from memory (`datasets.override`) never change.
+'''
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+import datasets
+
+
+class LiveDataset:
+    def __init__(self, name, columns=None, min_interval=1.0, history=64):
+        self.name = name
+        self.columns = columns
+        self.min_interval = min_interval
+        self.base = datasets.load_dataset(name, columns)
+        self.offset = datasets.source_offset(name)
+        self.rows_appended = 0
+        #   replaced as a whole on append, so readers never see half a batch
+        self._chunks = ()
+        self._joined = None
+        self._batches = deque(maxlen=history)
+        self._listeners = []
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def on_append(self, listener):
+        #   listener(new_rows) runs before the new rows become visible
+        self._listeners.append(listener)
+        return listener
+
+    def poll(self):
+        #   the new rows, or None
+        if self.offset is None or time.monotonic() - self._checked < self.min_interval:
+            return None
+        with self._lock:
+            self._checked = time.monotonic()
+            path = os.path.join(datasets.DATA_DIR, self.name + '.csv')
+            try:
+                if os.path.getsize(path) <= self.offset:
+                    return None
+            except OSError:
+                return None
+            start = self.offset
+            rows, end = datasets.read_appended(self.name, start)
+            if rows is None or rows.empty:
+                self.offset = end
+                return None
+            if self.columns is not None:
+                rows = rows[list(self.columns)]
+
+            for listener in self._listeners:
+                listener(rows)
+            self._chunks = self._chunks + (rows,)
+            self.rows_appended += len(rows)
+            self._batches.append((start, end, rows))
+            self.offset = end
+            return rows
+
+    @property
+    def version(self):
+        return self.offset
+
+    def latest_version(self):
+        #   the version once the rows appended so far are picked up
+        self.poll()
+        return self.version
+
+    def _parts(self):
+        return (self.base,) + self._chunks
+
+    def _join(self, frames):
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=self.base.index.name is None)
+
+    @property
+    def frame(self):
+        #   the whole current frame: a copy of every row once per batch, so
+        #   callbacks use `select` / `unique`
+        chunks = self._chunks
+        if not chunks:
+            return self.base
+        joined = self._joined
+        if joined is None or joined[0] is not chunks:
+            joined = (chunks, self._join((self.base,) + chunks))
+            self._joined = joined
+        return joined[1]
+
+    def select(self, column, values):
+        #   the rows whose `column` is one of `values`
+        return self._join([part[part[column].isin(values)] for part in self._parts()])
+
+    def unique(self, column):
+        #   the distinct values of `column`, in order of appearance
+        return pd.unique(pd.concat([pd.Series(part[column].unique()) for part in self._parts()]))
+
+    def changes_since(self, version):
+        #   rows added after `version`: empty when there are none (or this
+        #   process has not read them yet), None when they are no longer kept.
+        #   Another worker may have read the file in other batches: a version
+        #   inside a batch gets that whole batch
+        batches = list(self._batches)
+        if self.offset is None or version is None or version >= self.offset:
+            return self.base.iloc[:0]
+        if not batches or version < batches[0][0]:
+            return None
+        return pd.concat([rows for start, end, rows in batches if end > version])
+
+    def stats(self):
+        return {
+            'version' : self.version,
+            'rows' : len(self.base) + self.rows_appended,
+            'rows_appended' : self.rows_appended,
+            'offset' : self.offset,
+        }
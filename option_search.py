@@ -0,0 +1,106 @@
+'''
+Search-as-you-type options for dropdowns with a large vocabulary.
+
+`dcc.Dropdown(df['Indicator Name'].unique(), ...)` puts every distinct value in
+the page layout, once per dropdown. An `OptionIndex` sorts the distinct values
+once, and `searchable_dropdown` puts only the first `limit` of them (and the
+selected value) in the layout. Typing sends the text to a `search_value`
+callback, which answers with the best `limit` matches:
+
+    names starting with the text, alphabetically
+    then names with a word starting with the text
+
+Both come from `bisect` on sorted keys, so a search costs a few dozen string
+comparisons plus the matches it returns, however many values there are. Every
+word of every value is a key, cut to `KEY_LENGTH` characters; longer searches
+check the rest of the word on the candidates. One index can serve several
+dropdowns, and `add(values)` extends it (see `live_data.py`).
+'''
+import bisect
+import re
+
+from dash import dcc, Input, Output, State
+from dash.exceptions import PreventUpdate
+
+KEY_LENGTH = 24
+
+_WORD = re.compile(r'\w+')
+_NOT_WORD = re.compile(r'^\W+')
+
+
+class OptionIndex:
+    def __init__(self, values):
+        self._build(values)
+
+    def _build(self, values):
+        names = sorted({str(value) for value in values}, key=lambda name: (name.lower(), name))
+        lowers = [name.lower() for name in names]
+        #   (key, position of the name, start of the word); a word at the very
+        #   start is left out, as names starting with the text are searched in
+        #   `lowers` ('(legacy) ...' keeps 'legacy')
+        words = sorted((lower[match.start():match.start() + KEY_LENGTH], i, match.start())
+                       for i, lower in enumerate(lowers)
+                       for match in _WORD.finditer(lower) if match.start() > 0)
+        #   swapped as a whole, so a search never mixes old and new lists
+        self._index = (names, lowers, [w[0] for w in words], [w[1:] for w in words])
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def add(self, values):
+        names = self._index[0]
+        if not set(map(str, values)).issubset(names):
+            self._build(names + [str(value) for value in values])
+
+    def initial(self, limit=20, selected=None):
+        return self._with_selected(self._index[0][:limit], selected)
+
+    def search(self, text, limit=20, selected=None):
+        names, lowers, word_keys, word_positions = self._index
+        query = text.strip().lower()
+        if not query:
+            return self.initial(limit, selected)
+
+        found = []
+        i = bisect.bisect_left(lowers, query)
+        while i < len(lowers) and len(found) < limit and lowers[i].startswith(query):
+            found.append(i)
+            i += 1
+
+        seen = set(found)
+        #   words are keyed from their first letter: '(births' is found as 'births'
+        query = _NOT_WORD.sub('', query)
+        key = query[:KEY_LENGTH]
+        i = bisect.bisect_left(word_keys, key)
+        while query and i < len(word_keys) and len(found) < limit and word_keys[i].startswith(key):
+            position, start = word_positions[i]
+            if position not in seen and lowers[position].startswith(query, start):
+                seen.add(position)
+                found.append(position)
+            i += 1
+        return self._with_selected([names[position] for position in found], selected)
+
+    @staticmethod
+    def _with_selected(options, selected):
+        #   a dropdown only shows its value while the value is one of its options
+        if selected is not None and selected not in options:
+            options = options + [selected]
+        return options
+
+
+def searchable_dropdown(app, index, value, dropdown_id, limit=20, **dropdown_kwargs):
+    dropdown = dcc.Dropdown(index.initial(limit, value), value, id=dropdown_id, **dropdown_kwargs)
+
+    @app.callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        State(dropdown_id, 'value'),
+        prevent_initial_call=True
+    )
+    def search_options(search_value, selected):
+        #   an emptied search box keeps the options it has
+        if not search_value:
+            raise PreventUpdate
+        return index.search(search_value, limit, selected)
+
+    return dropdown
@@ -0,0 +1,33 @@
+'''
+Partial figure updates for cosmetic callback inputs.
+
+Flipping an axis between Linear and Log only changes `layout.xaxis.type`, yet
+the figure callbacks used to re-filter the data and re-serialize the whole
+figure. When only cosmetic inputs triggered a callback, it can return a
+`dash.Patch` carrying just the changed layout properties; inputs that change
+the data still rebuild the figure.
+'''
+from dash import Patch, ctx
+
+
+def only_triggered_by(*component_ids):
+    #   True when every input that fired this callback is one of component_ids
+    triggered = [t['prop_id'].rsplit('.', 1)[0] for t in ctx.triggered if t['prop_id'] != '.']
+    return bool(triggered) and all(t in component_ids for t in triggered)
+
+
+def axis_type_patch(xaxis_type, yaxis_type):
+    patch = Patch()
+    patch['layout']['xaxis']['type'] = 'linear' if xaxis_type == 'Linear' else 'log'
+    patch['layout']['yaxis']['type'] = 'linear' if yaxis_type == 'Linear' else 'log'
+    #   a zoomed range is in the units of the old axis type
+    patch['layout']['xaxis']['autorange'] = True
+    patch['layout']['yaxis']['autorange'] = True
+    return patch
+
+
+def yaxis_type_patch(axis_type):
+    patch = Patch()
+    patch['layout']['yaxis']['type'] = 'linear' if axis_type == 'Linear' else 'log'
+    patch['layout']['yaxis']['autorange'] = True
+    return patch
@@ -0,0 +1,71 @@
+'''
+Server-side rasterization of scatters too large to draw point by point.
+
+A scatter trace ships every point it draws, so a million rows mean tens of
+megabytes of JSON and a browser that gives up. `rasterize` bins the points in
+view into a `shape` grid of equal cells instead, and the figure templates draw
+the counts as one heatmap trace:
+
+    counts      --> (rows, columns) points per cell, NaN where empty
+    x, y        --> cell centres in data units
+    first       --> (rows, columns) position of one point in each cell (-1
+                    where empty), e.g. to label a cell with one of its countries
+
+Cells come from one `np.bincount` over the flattened cell numbers, which is
+linear in the number of points (`np.histogram2d` searches the bin edges of every
+point). On a log axis the cells are equal in log10 space, as the axis draws
+them. Callbacks rasterize only above a point threshold and re-rasterize the
+zoomed window on every zoom, so zooming far enough in switches back to points.
+'''
+import numpy as np
+
+
+def _extent(values, value_range, log):
+    #   (low, high) in binning units
+    if value_range is not None:
+        low, high = value_range
+        if log:
+            low, high = np.log10(low), np.log10(high)
+    elif len(values):
+        low, high = values.min(), values.max()
+    else:
+        low, high = 0.0, 1.0
+    if high <= low:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+def _cells(values, low, high, n):
+    cell = ((values - low) * (n / (high - low))).astype(np.intp)
+    #   the top edge belongs to the last cell
+    return np.minimum(cell, n - 1)
+
+
+def rasterize(x, y, x_range=None, y_range=None, shape=(200, 150), x_log=False, y_log=False):
+    n_x, n_y = shape
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bx = np.log10(x) if x_log else x
+        by = np.log10(y) if y_log else y
+
+    x_low, x_high = _extent(bx[np.isfinite(bx)], x_range, x_log)
+    y_low, y_high = _extent(by[np.isfinite(by)], y_range, y_log)
+    rows = np.flatnonzero(np.isfinite(bx) & np.isfinite(by)
+                          & (bx >= x_low) & (bx <= x_high) & (by >= y_low) & (by <= y_high))
+
+    cell = _cells(by[rows], y_low, y_high, n_y) * n_x + _cells(bx[rows], x_low, x_high, n_x)
+    counts = np.bincount(cell, minlength=n_x * n_y).astype(float).reshape(n_y, n_x)
+    counts[counts == 0] = np.nan
+
+    first = np.full(n_x * n_y, len(x), dtype=np.intp)
+    np.minimum.at(first, cell, rows)
+    first[first == len(x)] = -1
+
+    x_centres = x_low + (np.arange(n_x) + 0.5) * (x_high - x_low) / n_x
+    y_centres = y_low + (np.arange(n_y) + 0.5) * (y_high - y_low) / n_y
+    if x_log:
+        x_centres = 10 ** x_centres
+    if y_log:
+        y_centres = 10 ** y_centres
+    return counts, x_centres, y_centres, first.reshape(n_y, n_x)
@@ -0,0 +1,132 @@
+'''
+One process serving every demo.
+
+The demos of `app_callback.py`, `app_graph.py` and `app_layout.py` are functions
+that each build their own Dash app. `PAGES` lists them under a URL path, and
+`DemoDispatcher` is a WSGI application that mounts every demo at its path and
+builds it on the first request that reaches it: the demo's module, its heavy
+imports (pandas, plotly, ...) and its data are only loaded then, so a process
+only holds the demos that were actually visited.
+
+    python registry.py                  # http://127.0.0.1:8050/ lists the demos
+
+Every demo built here encodes its callback responses with `ENCODER`, serves
+its layout from a cache of pre-compressed bytes with an ETag and compresses
+other responses of `COMPRESS_THRESHOLD` bytes or more (see
+`serialization.py`).
+
+The demos stay separate Dash apps mounted side by side rather than pages of a
+single `dash.register_page` app: they reuse component ids ('year-slider',
+'my-output', ...), and a Dash app needs all of its callbacks registered before
+it serves its first page, which rules out loading a page lazily.
+'''
+import argparse
+import importlib
+import threading
+from html import escape
+
+from werkzeug.exceptions import NotFound
+from werkzeug.serving import run_simple
+from werkzeug.utils import redirect
+from werkzeug.wrappers import Response
+
+from serialization import cache_layout, compress_responses, use_encoder
+
+PAGES = [
+    #   (url path, module, demo, title)
+    ('callback/simple', 'app_callback', 1, 'Simple callback'),
+    ('callback/slider', 'app_callback', 2, 'Callbacks with figure and slider'),
+    ('callback/multiple-inputs', 'app_callback', 3, 'Multiple inputs'),
+    ('callback/multiple-outputs', 'app_callback', 4, 'Multiple outputs'),
+    ('callback/chained', 'app_callback', 5, 'Chained callback'),
+    ('callback/state', 'app_callback', 6, 'Dash app with state'),
+    ('callback/without-id', 'app_callback', 7, 'Reference without id'),
+    ('graph/hover-data', 'app_graph', 1, 'Hover data'),
+    ('graph/interactions', 'app_graph', 2, 'Basic interactions'),
+    ('graph/crossfilter', 'app_graph', 3, 'Generic crossfilter recipe'),
+    ('layout/simple', 'app_layout', 'simple', 'Simple layout'),
+    ('layout/styling', 'app_layout', 'styling', 'Styling'),
+    ('layout/reusable', 'app_layout', 'reusable', 'Reusable components'),
+    ('layout/graph', 'app_layout', 'graph', 'Graph'),
+    ('layout/markdown', 'app_layout', 'markdown', 'Markdown'),
+    ('layout/dcc', 'app_layout', 'dcc', 'Core components'),
+]
+
+
+#   callback response encoder ('auto', 'orjson' or 'json') and the smallest
+#   response worth compressing, in bytes
+ENCODER = 'auto'
+COMPRESS_THRESHOLD = 1024
+
+
+def create_app(module, demo, **dash_kwargs):
+    use_encoder(ENCODER)
+    app = importlib.import_module(module).DEMOS[demo](**dash_kwargs)
+    cache_layout(app)
+    compress_responses(app, threshold=COMPRESS_THRESHOLD)
+    return app
+
+
+class DemoDispatcher:
+    def __init__(self, pages=PAGES, **dash_kwargs):
+        self.pages = {'/' + path : (module, demo, title) for path, module, demo, title in pages}
+        self.dash_kwargs = dash_kwargs
+        self.apps = {}
+        self._lock = threading.Lock()
+
+    def app(self, prefix, script_name=''):
+        #   built once, on first use; requests for other demos are not held up
+        #   once their own app exists
+        app = self.apps.get(prefix)
+        if app is not None:
+            return app
+        with self._lock:
+            if prefix not in self.apps:
+                module, demo, title = self.pages[prefix]
+                app = create_app(module, demo,
+                                 routes_pathname_prefix='/',
+                                 requests_pathname_prefix=script_name + prefix + '/',
+                                 **self.dash_kwargs)
+                app.title = title
+                self.apps[prefix] = app
+            return self.apps[prefix]
+
+    def preload(self, script_name=''):
+        #   build every demo now rather than on first visit
+        for prefix in self.pages:
+            self.app(prefix, script_name)
+
+    def index(self):
+        items = ''.join(
+            '<li><a href="{}/">{}</a> <small>{}{}</small></li>'.format(
+                escape(prefix[1:]), escape(title), escape(module),
+                ' (loaded)' if prefix in self.apps else '')
+            for prefix, (module, demo, title) in self.pages.items())
+        return Response('<!DOCTYPE html><title>Dash demos</title><h1>Dash demos</h1>'
+                        '<ul>{}</ul>'.format(items), mimetype='text/html')
+
+    def __call__(self, environ, start_response):
+        script_name = environ.get('SCRIPT_NAME', '')
+        path = environ.get('PATH_INFO', '') or '/'
+        if path == '/':
+            return self.index()(environ, start_response)
+
+        for prefix in self.pages:
+            if path == prefix:
+                #   Dash resolves its assets and API relative to the trailing slash
+                return redirect(script_name + prefix + '/')(environ, start_response)
+            if path.startswith(prefix + '/'):
+                app = self.app(prefix, script_name)
+                environ = dict(environ, SCRIPT_NAME=script_name + prefix,
+                               PATH_INFO=path[len(prefix):])
+                return app.server(environ, start_response)
+
+        return NotFound()(environ, start_response)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve every demo from one process.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args()
+    run_simple(args.host, args.port, DemoDispatcher(), threaded=True)
@@ -0,0 +1,253 @@
+'''
+Callback response encoding and HTTP compression.
+
+Dash encodes every callback response with `plotly.io.json.to_json_plotly`. With
+orjson installed that tries orjson once, and on the first value orjson cannot
+take (a Dash component, an object array of country names, ...) falls back to a
+pure Python walk over the whole payload followed by a second encode. Without
+orjson it is the standard `json` module.
+
+`use_encoder('orjson')` replaces that with a single orjson pass: NumPy arrays
+are written natively and the few values orjson does not know are handed to
+`_default` one at a time. `use_encoder('json')` restores Dash's own encoder and
+`'auto'` picks orjson when it is installed. Time spent encoding is added to
+`flask.g.encode_seconds`, which `instrumentation` reports as the 'encode' phase
+of the callback.
+
+`compress_responses(app)` compresses responses larger than `threshold` bytes
+with brotli (when installed and accepted by the browser) or gzip. The Dash
+component bundles never change for a given URL and are compressed only once.
+Sizes before and after go to `flask.g.compression` for the per-callback
+compression ratio.
+
+`cache_layout(app)` serves `_dash-layout` from a cache: the layout is encoded
+once, compressed once per encoding (at the highest levels, as that happens only
+once, when the app is created) and sent with an ETag, so a browser revalidating
+its copy gets an empty `304 Not Modified`. Assigning a new `app.layout`
+invalidates the cache; a layout changed in place is not noticed. Layout
+functions are built per page load and served as before.
+
+A layout that embeds data which changes while the server runs (the
+`LiveDataset` demos) can be written as a function of a version instead and
+decorated with `versioned_layout(version)`: it is built, encoded and given an
+ETag once per value of `version()`, and compressed once per encoding the first
+time a browser asks for that encoding after a change.
+
+orjson and brotli are both optional.
+'''
+import functools
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import dash._callback
+import flask
+from dash import html
+from dash._utils import to_json as dash_to_json
+from plotly.io.json import to_json_plotly
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def _default(value):
+    #   everything orjson cannot write natively
+    if hasattr(value, 'to_plotly_json'):
+        return value.to_plotly_json()
+    if hasattr(value, 'tolist'):
+        #   object / non-contiguous arrays, numpy scalars orjson does not know
+        return value.tolist()
+    from _plotly_utils.utils import PlotlyJSONEncoder
+    return PlotlyJSONEncoder().default(value)
+
+
+def orjson_dumps(value):
+    try:
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    except TypeError:
+        #   e.g. integers beyond 64 bits, which orjson does not write
+        return to_json_plotly(value, engine='json')
+
+
+def pretty(value):
+    #   the graph event inspectors
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, indent=2)
+
+
+ENCODERS = {
+    'json' : dash_to_json,
+    'orjson' : orjson_dumps,
+}
+
+
+def _timed(encoder):
+    def to_json(value):
+        start = time.perf_counter()
+        try:
+            return encoder(value)
+        finally:
+            if flask.has_request_context():
+                flask.g.encode_seconds = flask.g.get('encode_seconds', 0.0) + time.perf_counter() - start
+    to_json.encoder = encoder
+    return to_json
+
+
+def use_encoder(name='auto'):
+    #   process-wide: Dash looks the encoder up in `dash._callback`
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson' and orjson is None:
+        raise ImportError('the orjson encoder needs `pip install orjson`')
+    dash._callback.to_json = _timed(ENCODERS[name])
+    return name
+
+
+def _accepted_encoding():
+    accepted = flask.request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding, gzip_level, brotli_quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def compress_responses(app, threshold=1024, gzip_level=6, brotli_quality=4, max_cached=64):
+    #   call after `instrument(app)`: Flask runs the later after_request first,
+    #   so the metrics see the compressed size
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    def compress(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+            return response
+        encoding = _accepted_encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < threshold:
+            return response
+
+        start = time.perf_counter()
+        etag = response.headers.get('ETag')
+        if etag is not None or response.cache_control.max_age:
+            #   component suites: fingerprinted (long max-age) or ETagged,
+            #   identical bytes on every request
+            key = (flask.request.path, etag, encoding)
+            with lock:
+                compressed = cache.get(key)
+            if compressed is None:
+                compressed = _compress(data, encoding, gzip_level, brotli_quality)
+                with lock:
+                    cache[key] = compressed
+                    while len(cache) > max_cached:
+                        cache.popitem(last=False)
+        else:
+            compressed = _compress(data, encoding, gzip_level, brotli_quality)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        flask.g.compress_seconds = time.perf_counter() - start
+        flask.g.compression = (len(data), len(compressed))
+        return response
+
+    app.server.after_request(compress)
+
+
+class VersionedLayout:
+    #   a layout function `cache_layout` caches: build(version) runs once per
+    #   value of version()
+    def __init__(self, build, version):
+        self.build = functools.lru_cache(maxsize=1)(build)
+        self.version = version
+
+    def __call__(self):
+        return self.build(self.version())
+
+
+def versioned_layout(version):
+    def decorator(build):
+        return VersionedLayout(build, version)
+    return decorator
+
+
+def cache_layout(app, gzip_level=9, brotli_quality=11):
+    endpoint = app.config.routes_pathname_prefix + '_dash-layout'
+    serve_layout = app.server.view_functions[endpoint]
+    #   [layout, body, digest, {encoding: compressed body}]
+    cached = [None, None, None, {}]
+    lock = threading.Lock()
+
+    def entry(layout, encodings):
+        with lock:
+            if cached[0] is not layout:
+                #   as `app._layout_value()`, for this very layout
+                if app._extra_components:
+                    value = html.Div(children=[layout] + app._extra_components)
+                else:
+                    value = layout
+                body = dash._callback.to_json(value).encode('utf-8')
+                cached[:] = [layout, body, hashlib.sha1(body).hexdigest(), {}]
+            body, digest, compressed = cached[1:]
+            for encoding in encodings:
+                if encoding not in compressed:
+                    compressed[encoding] = _compress(body, encoding, gzip_level,
+                                                     brotli_quality)
+            return body, digest, compressed
+
+    def cached_layout():
+        layout = app.layout
+        if isinstance(layout, VersionedLayout):
+            #   the same object for as long as the version holds
+            layout = layout()
+        elif app._layout_is_function:
+            return serve_layout()
+
+        encoding = _accepted_encoding()
+        body, digest, compressed = entry(layout, [encoding] if encoding else [])
+        etag = '{}-{}'.format(digest, encoding) if encoding else digest
+        if flask.request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+        else:
+            response = flask.Response(compressed[encoding] if encoding else body,
+                                      mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        #   always revalidate: the layout may be replaced while the server runs
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.server.view_functions[endpoint] = cached_layout
+    if app.layout is not None and (isinstance(app.layout, VersionedLayout)
+                                   or not app._layout_is_function):
+        #   now, so that workers forked after `serve.py` preloads share it
+        layout = app.layout() if app._layout_is_function else app.layout
+        entry(layout, ['gzip'] if brotli is None else ['gzip', 'br'])
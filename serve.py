@@ -0,0 +1,78 @@
+'''
+Production entry point: every demo of `registry.py` behind gunicorn workers.
+
+`app.run_server(debug=True)` is a single-process development server, and
+starting N gunicorn workers the usual way would load N private copies of every
+data frame. Here the master process
+
+    1.  builds / validates the dataset caches once (`datasets.prepare`)
+    2.  builds every demo app, so each data frame and its derived indexes
+        exist once, in the master
+    3.  freezes the garbage collector, so that collections in the workers do
+        not write to (and thereby copy) the pages of those objects
+
+and then forks the workers. The numeric columns are read-only views on the
+memory-mapped column files, shared through the page cache by every worker; the
+rest of the preloaded state is shared copy-on-write. Resident memory per
+additional worker stays close to that of an idle interpreter.
+
+    python serve.py                                 # one worker per core, 4 threads each
+    python serve.py --workers 8 --threads 2 --bind 0.0.0.0:8050
+    python serve.py --lazy                          # build demos in each worker on first visit
+
+Caches, coalescers and `/metrics` counters are per worker. gunicorn is an
+optional dependency, only needed for this entry point (`pip install gunicorn`).
+'''
+import argparse
+import gc
+import multiprocessing
+
+import datasets
+from registry import DemoDispatcher
+
+
+def create_server(lazy=False):
+    datasets.prepare()
+    dispatcher = DemoDispatcher()
+    if not lazy:
+        dispatcher.preload()
+    #   everything allocated so far is shared with the workers: keep it out of
+    #   the collector's reach
+    gc.collect()
+    gc.freeze()
+    return dispatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve every demo with gunicorn workers.')
+    parser.add_argument('--bind', default='127.0.0.1:8050')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--timeout', type=int, default=60)
+    parser.add_argument('--lazy', action='store_true',
+                        help='build each demo in each worker on first visit (less startup, more memory)')
+    args = parser.parse_args()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit('serve.py needs gunicorn: pip install gunicorn')
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', args.bind)
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', args.timeout)
+            #   load the app in the master, before forking
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return create_server(lazy=args.lazy)
+
+    Server().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''
+Server-side state for callbacks, kept per browser session.
+
+A callback that needs something it computed earlier (a filtered DataFrame, a
+selection mask, the history of a form) would normally send it to the browser in
+a `dcc.Store` and get it back as a `State` on every request. A `SessionStore`
+keeps such values on the server instead:
+
+    store = SessionStore(MemoryBackend())
+    store.install(app)                  # hands every browser a session cookie
+
+    store.set('selection', mask)        # inside a callback
+    mask = store.get('selection')
+
+Only the session token, a 32 character cookie, travels with the requests.
+Values are pickled, so anything picklable can be stored. Two backends:
+
+    MemoryBackend   --> a dictionary in the server process; fastest, but every
+                        worker process of `serve.py` has its own
+    DiskBackend     --> an SQLite file under `SESSION_DIR`; shared by every
+                        worker and kept across restarts
+
+Both drop a value `ttl` seconds after it was last read or written, and the
+least recently used values once the backend holds more than `max_bytes`. A
+single value larger than `max_item_bytes` is refused with a `ValueError`.
+'''
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import flask
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_DIR = os.environ.get('DASHDEMO_SESSION_DIR', os.path.join(BASE_DIR, '.sessions'))
+
+COOKIE = 'dashdemo_session'
+
+_TOKEN = re.compile('^[0-9a-f]{32}$')
+
+
+class MemoryBackend:
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evicted = 0
+        #   key --> [data, ttl, expires], least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        data, ttl, expires = self._entries.pop(key)
+        self.size -= len(data)
+
+    def _evict(self, now):
+        #   with one ttl per store, the least recently used entry expires first
+        while self._entries:
+            key, (data, ttl, expires) = next(iter(self._entries.items()))
+            if expires > now and self.size <= self.max_bytes:
+                break
+            self._drop(key)
+            self.evicted += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= now:
+                self._drop(key)
+                return None
+            entry[2] = now + entry[1]
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, data, ttl):
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = [data, ttl, now + ttl]
+            self.size += len(data)
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries' : len(self._entries),
+                'bytes' : self.size,
+                'evicted' : self.evicted,
+            }
+
+
+class DiskBackend:
+    def __init__(self, path=None, max_bytes=512 * 2 ** 20):
+        self.path = path or os.path.join(SESSION_DIR, 'sessions.sqlite')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'key TEXT PRIMARY KEY, data BLOB, size INTEGER, ttl REAL, expires REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)')
+
+    def _connect(self):
+        #   one connection per thread, and none inherited across a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        db = self._connect()
+        row = db.execute('SELECT data, ttl FROM entries WHERE key = ? AND expires > ?',
+                         (key, now)).fetchone()
+        if row is None:
+            return None
+        db.execute('UPDATE entries SET expires = ? WHERE key = ?', (now + row[1], key))
+        return row[0]
+
+    def set(self, key, data, ttl):
+        now = time.time()
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                       (key, sqlite3.Binary(data), len(data), ttl, now + ttl))
+            db.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+            excess = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0] - self.max_bytes
+            if excess > 0:
+                #   least recently used first
+                for old_key, size in db.execute('SELECT key, size FROM entries ORDER BY expires').fetchall():
+                    if excess <= 0:
+                        break
+                    db.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                    excess -= size
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def stats(self):
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires > ?',
+            (time.time(),)).fetchone()
+        return {
+            'entries' : entries,
+            'bytes' : size,
+        }
+
+
+def session_token():
+    #   the token of the browser making the current request
+    token = flask.g.get('session_token')
+    if token is None:
+        token = flask.request.cookies.get(COOKIE, '')
+        if not _TOKEN.match(token):
+            token = uuid.uuid4().hex
+            flask.g.new_session_token = token
+        flask.g.session_token = token
+    return token
+
+
+def install_session_cookie(app):
+    #   hands every browser a session cookie; once per app, however many
+    #   stores and throttles ask for it
+    if app.server.extensions.get('dashdemo_session_cookie'):
+        return
+    app.server.extensions['dashdemo_session_cookie'] = True
+
+    def set_cookie(response):
+        #   the page itself sets it, before its first callback request
+        session_token()
+        token = flask.g.get('new_session_token')
+        if token is not None:
+            response.set_cookie(COOKIE, token, httponly=True, samesite='Lax')
+        return response
+
+    app.server.after_request(set_cookie)
+
+
+class SessionStore:
+    def __init__(self, backend=None, ttl=3600, max_item_bytes=16 * 2 ** 20, namespace=''):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.max_item_bytes = max_item_bytes
+        self.namespace = namespace
+
+    def install(self, app):
+        install_session_cookie(app)
+
+    def _key(self, name, token):
+        return '{}/{}/{}'.format(self.namespace, token or session_token(), name)
+
+    def get(self, name, default=None, token=None):
+        data = self.backend.get(self._key(name, token))
+        if data is None:
+            return default
+        return pickle.loads(data)
+
+    def set(self, name, value, token=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_item_bytes:
+            raise ValueError('{} is {} bytes, more than the {} a session value may take'.format(
+                name, len(data), self.max_item_bytes))
+        self.backend.set(self._key(name, token), data, self.ttl)
+
+    def delete(self, name, token=None):
+        self.backend.delete(self._key(name, token))
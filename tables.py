@@ -0,0 +1,68 @@
+'''
+HTML table builders for data frames.
+
+`generate_table` pulls each column out of the frame once as a NumPy slice and
+zips the slices into rows, instead of building a row Series per cell with
+`dataframe.iloc[i][col]`.
+
+`paged_table` only puts the first page in the layout and registers a callback
+that sends the requested page when the user pages through, so the payload stays
+the same size however many rows the frame has.
+'''
+from dash import html, dcc, Input, Output, State, ctx
+
+
+def _header(dataframe):
+    return html.Thead(
+        html.Tr([html.Th(col) for col in dataframe.columns])
+    )
+
+
+def _rows(dataframe, start, stop):
+    page = dataframe.iloc[start:stop]
+    columns = [page[col].to_numpy().tolist() for col in page.columns]
+    return [html.Tr([html.Td(value) for value in row]) for row in zip(*columns)]
+
+
+def generate_table(dataframe, max_rows=10):
+    return html.Table([
+        _header(dataframe),
+        html.Tbody(_rows(dataframe, 0, max_rows))
+    ])
+
+
+def paged_table(app, dataframe, table_id, page_size=10):
+    n_pages = max(1, -(-len(dataframe) // page_size))
+
+    def page_label(page):
+        return 'Page {} of {}'.format(page + 1, n_pages)
+
+    layout = html.Div([
+        html.Table([
+            _header(dataframe),
+            html.Tbody(_rows(dataframe, 0, page_size), id=table_id + '-body')
+        ], id=table_id),
+        html.Div([
+            html.Button('Previous', id=table_id + '-previous', n_clicks=0),
+            html.Span(page_label(0), id=table_id + '-page', style={'padding' : '0 10px'}),
+            html.Button('Next', id=table_id + '-next', n_clicks=0),
+        ]),
+        dcc.Store(id=table_id + '-page-index', data=0),
+    ])
+
+    @app.callback(
+        Output(table_id + '-body', 'children'),
+        Output(table_id + '-page', 'children'),
+        Output(table_id + '-page-index', 'data'),
+        Input(table_id + '-previous', 'n_clicks'),
+        Input(table_id + '-next', 'n_clicks'),
+        State(table_id + '-page-index', 'data'),
+        prevent_initial_call=True
+    )
+    def change_page(previous_clicks, next_clicks, page):
+        step = -1 if ctx.triggered_id == table_id + '-previous' else 1
+        page = min(max(page + step, 0), n_pages - 1)
+        start = page * page_size
+        return _rows(dataframe, start, start + page_size), page_label(page), page
+
+    return layout